@@ -7,22 +7,41 @@ import sys
 import argparse
 
 
-def run_lcd_test():
+def run_lcd_test(virtual=False):
     """Run the LCD hardware test"""
     from modules.lcd import run_test
     print("=" * 50)
     print("Starting LCD Test")
     print("=" * 50)
-    run_test()
+    run_test(virtual=virtual)
+
+
+def run_lcd_benchmark(virtual=False):
+    """Run the LCD frame encoder/transfer benchmark"""
+    from modules.lcd import run_benchmark
+    print("=" * 50)
+    print("Starting LCD Benchmark")
+    print("=" * 50)
+    run_benchmark(virtual=virtual)
 
 
-def run_music_player():
+def run_music_player(virtual=False, fps=10, rotation=0, show_stats=False, mpd_host=None):
     """Run the music player UI"""
     from modules.music_player import run_player
     print("=" * 50)
     print("Starting Music Player")
     print("=" * 50)
-    run_player()
+    run_player(virtual=virtual, fps=fps, rotation=rotation, show_stats=show_stats,
+               mpd_host=mpd_host)
+
+
+def run_music_benchmark(frames=200, output=None, baseline=None):
+    """Run the headless music player render/encode benchmark suite"""
+    from modules.music_player import run_benchmarks
+    print("=" * 50)
+    print("Starting Music Player Benchmark")
+    print("=" * 50)
+    run_benchmarks(frames=frames, output=output, baseline=baseline)
 
 
 def run_nfc_test():
@@ -59,18 +78,24 @@ def list_tests():
     """Display available tests"""
     print("\nAvailable tests:")
     print("  lcd          - Test the 1.3inch LCD HAT (ST7789)")
+    print("  lcd-bench    - Benchmark LCD frame encoding and transfer")
     print("  music        - Run the music player UI")
+    print("  music-bench  - Benchmark music player rendering (no hardware needed)")
     print("  nfc          - Test the MFRC522 NFC/RFID reader")
     print("  nfc-diag     - Run NFC hardware diagnostic")
     print("  dac          - Test the HiFi DAC HAT with MPD/MPC")
     print("  dac-diag     - Run DAC hardware diagnostic")
     print("\nUsage examples:")
     print("  python app.py lcd")
+    print("  python app.py lcd-bench")
     print("  python app.py music")
     print("  python app.py nfc")
     print("  python app.py nfc-diag")
     print("  python app.py dac")
     print("  python app.py dac-diag")
+    print("  python app.py music --virtual")
+    print("  python app.py music --mpd")
+    print("  python app.py music-bench --output bench.json")
     print("  python app.py --list")
 
 
@@ -81,11 +106,16 @@ def main():
         epilog="""
 Examples:
   python app.py lcd           Run LCD hardware test
+  python app.py lcd-bench     Run LCD frame benchmark
   python app.py music         Run music player
   python app.py nfc           Run NFC/RFID reader test
   python app.py nfc-diag      Run NFC hardware diagnostic
   python app.py dac           Run DAC HAT test with MPD/MPC
   python app.py dac-diag      Run DAC hardware diagnostic
+  python app.py music --virtual  Run music player on a virtual panel
+  python app.py music --mpd   Run music player on MPD's queue
+  python app.py music-bench --output new.json --baseline old.json
+                              Benchmark rendering and compare two runs
   python app.py --list        Show all available tests
         """
     )
@@ -93,7 +123,7 @@ Examples:
     parser.add_argument(
         'test',
         nargs='?',
-        choices=['lcd', 'music', 'nfc', 'nfc-diag', 'dac', 'dac-diag'],
+        choices=['lcd', 'lcd-bench', 'music', 'music-bench', 'nfc', 'nfc-diag', 'dac', 'dac-diag'],
         help='Test module to run'
     )
     
@@ -103,6 +133,58 @@ Examples:
         help='List all available tests'
     )
     
+    parser.add_argument(
+        '--virtual',
+        action='store_true',
+        help='Use a virtual LCD panel instead of the HAT (lcd, lcd-bench, music)'
+    )
+    
+    parser.add_argument(
+        '--fps',
+        type=float,
+        default=10,
+        help='Target frame rate for the music player (default: 10)'
+    )
+    
+    parser.add_argument(
+        '--rotation',
+        type=int,
+        choices=[0, 90, 180, 270],
+        default=0,
+        help='Clockwise display rotation for the music player (default: 0)'
+    )
+    
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Print display-path timings and counters on exit (music)'
+    )
+    
+    parser.add_argument(
+        '--mpd',
+        nargs='?',
+        const='',
+        metavar='HOST',
+        help='Play the MPD queue (default host: $MPD_HOST or localhost) (music)'
+    )
+    
+    parser.add_argument(
+        '--frames',
+        type=int,
+        default=200,
+        help='Frames per benchmark case (music-bench, default: 200)'
+    )
+    
+    parser.add_argument(
+        '--output',
+        help='Write benchmark results to this JSON file (music-bench)'
+    )
+    
+    parser.add_argument(
+        '--baseline',
+        help='Compare against earlier JSON benchmark results (music-bench)'
+    )
+    
     args = parser.parse_args()
     
     if args.list:
@@ -117,9 +199,16 @@ Examples:
     
     try:
         if args.test == 'lcd':
-            run_lcd_test()
+            run_lcd_test(virtual=args.virtual)
+        elif args.test == 'lcd-bench':
+            run_lcd_benchmark(virtual=args.virtual)
         elif args.test == 'music':
-            run_music_player()
+            run_music_player(virtual=args.virtual, fps=args.fps,
+                             rotation=args.rotation, show_stats=args.stats,
+                             mpd_host=args.mpd)
+        elif args.test == 'music-bench':
+            run_music_benchmark(frames=args.frames, output=args.output,
+                                baseline=args.baseline)
         elif args.test == 'nfc':
             run_nfc_test()
         elif args.test == 'nfc-diag':
@@ -1,44 +1,86 @@
 #!/usr/bin/env python3
 """
-HiFi DAC HAT Test Script using MPD and MPC
+HiFi DAC HAT Test Script using MPD
 
 This script tests the Inno-Maker HiFi DAC HAT by:
-1. Checking MPD/MPC installation
+1. Connecting to MPD and checking the service
 2. Playing music from the Music folder
 3. Testing playback controls (play, pause, next, volume)
+
+MPD is driven over a persistent protocol connection (modules.mpd) rather
+than by running mpc for every command.
 """
 
 import subprocess
 import sys
 import time
 import os
+from modules.mpd import MPDError, get_broker
+
+
+def format_time(seconds):
+    """Convert seconds to M:SS format"""
+    seconds = int(float(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def format_song(song):
+    """Describe a song like `mpc current`: "Artist - Title", or its file name"""
+    if not song:
+        return ""
+    if 'Title' in song:
+        return f"{song['Artist']} - {song['Title']}" if 'Artist' in song else song['Title']
+    return os.path.basename(song.get('file', ''))
+
+
+def format_status(status, song):
+    """Describe player status in the same layout as `mpc status`"""
+    lines = []
+    state = status.get('state', 'stop')
+    if state != 'stop' and song:
+        position = int(status.get('song', 0)) + 1
+        elapsed = float(status.get('elapsed', 0))
+        duration = float(status.get('duration', song.get('duration', 0)) or 0)
+        percent = int(100 * elapsed / duration) if duration else 0
+        state_name = 'playing' if state == 'play' else 'paused'
+        lines.append(format_song(song))
+        lines.append(f"[{state_name}] #{position}/{status.get('playlistlength', 0)} "
+                     f"{format_time(elapsed)}/{format_time(duration)} ({percent}%)")
+    
+    def flag(name):
+        return 'on' if status.get(name) == '1' else 'off'
+    
+    volume = status.get('volume', '-1')
+    volume = 'n/a' if volume == '-1' else f"{volume}%"
+    lines.append(f"volume: {volume}   repeat: {flag('repeat')}   random: {flag('random')}   "
+                 f"single: {flag('single')}   consume: {flag('consume')}")
+    return "\n".join(lines)
 
 
 class DACTester:
-    """Test the HiFi DAC HAT using MPD and MPC"""
+    """Test the HiFi DAC HAT using MPD"""
     
-    def __init__(self):
-        self.mpc_available = False
+    def __init__(self, mpd=None):
+        """
+        Args:
+            mpd: MPD client to use (default: one sharing the process-wide broker)
+        """
+        self.mpd = mpd or get_broker().client()
+        self.mpd_connected = False
         self.mpd_running = False
-        
-    def check_mpc_installed(self):
-        """Check if MPC is installed"""
-        print("\n[1/5] Checking MPC installation...")
+    
+    def check_mpd_connection(self):
+        """Check that MPD accepts protocol connections"""
+        print("\n[1/5] Connecting to MPD...")
         try:
-            result = subprocess.run(['which', 'mpc'], 
-                                  capture_output=True, 
-                                  text=True,
-                                  timeout=5)
-            if result.returncode == 0:
-                print(f"✓ MPC found at: {result.stdout.strip()}")
-                self.mpc_available = True
-                return True
-            else:
-                print("✗ MPC not found")
-                print("  Install with: sudo apt-get install mpc")
-                return False
-        except Exception as e:
-            print(f"✗ Error checking MPC: {e}")
+            self.mpd.connect()
+            print(f"✓ Connected to MPD {self.mpd.mpd_version} at {self.mpd.address}")
+            self.mpd_connected = True
+            return True
+        except MPDError as e:
+            print(f"✗ {e}")
+            print("  Start MPD with: sudo systemctl start mpd")
+            print("  Set MPD_HOST/MPD_PORT if it listens elsewhere")
             return False
     
     def check_mpd_running(self):
@@ -70,15 +112,7 @@ class DACTester:
         actual_user = os.environ.get('SUDO_USER') or os.environ.get('USER')
         actual_home = pwd.getpwnam(actual_user).pw_dir if actual_user else os.path.expanduser('~')
         
-        # Get MPD music directory from config
-        try:
-            result = subprocess.run(['mpc', 'version'], 
-                                  capture_output=True, 
-                                  text=True,
-                                  timeout=5)
-            print(f"  MPD Version: {result.stdout.strip().split()[1] if result.returncode == 0 else 'unknown'}")
-        except:
-            pass
+        print(f"  MPD Version: {self.mpd.mpd_version or 'unknown'}")
         
         # Common music directory locations (prioritize actual user's directory)
         music_dirs = [
@@ -123,68 +157,42 @@ class DACTester:
         print("\n[4/5] Checking MPD database...")
         try:
             # First check current database stats
-            result = subprocess.run(['mpc', 'stats'], 
-                                  capture_output=True,
-                                  text=True,
-                                  timeout=5)
+            stats = self.mpd.stats()
+            print(f"  Artists: {stats.get('artists', 0)}")
+            print(f"  Albums: {stats.get('albums', 0)}")
+            print(f"  Songs: {stats.get('songs', 0)}")
             
-            if result.returncode == 0:
-                for line in result.stdout.split('\n'):
-                    if 'Songs:' in line or 'Artists:' in line or 'Albums:' in line:
-                        print(f"  {line.strip()}")
-                
-                # Check if database has songs
-                songs_match = None
-                for line in result.stdout.split('\n'):
-                    if 'Songs:' in line:
-                        songs_match = line
-                        break
-                
-                if songs_match and 'Songs: 0' not in songs_match:
-                    print("✓ Database already contains music")
-                    return True
+            if int(stats.get('songs', 0)) > 0:
+                print("✓ Database already contains music")
+                return True
             
             # If no songs, try updating
             print("  No songs in database, updating...")
-            subprocess.run(['mpc', 'update'], 
-                         capture_output=True, 
-                         timeout=10)
+            self.mpd.update()
             print("  Database update initiated")
             
-            # Wait for update to complete
+            # Wait for the scan job to finish (MPD drops updating_db when done)
             print("  Waiting for database scan to complete...", end='', flush=True)
-            time.sleep(4)
+            deadline = time.monotonic() + 30
+            while 'updating_db' in self.mpd.status() and time.monotonic() < deadline:
+                time.sleep(0.25)
             print(" done")
             
             # Check stats again
-            result = subprocess.run(['mpc', 'stats'], 
-                                  capture_output=True,
-                                  text=True,
-                                  timeout=5)
-            
-            if result.returncode == 0:
-                song_count = 0
-                for line in result.stdout.split('\n'):
-                    if 'Songs:' in line:
-                        try:
-                            song_count = int(line.split(':')[1].strip())
-                        except:
-                            pass
-                        print(f"\n  {line.strip()}")
-                
-                if song_count > 0:
-                    print("✓ Database updated successfully")
-                    return True
-                else:
-                    print("⚠ Database updated but no songs found")
-                    print("  This may indicate:")
-                    print("    - Music directory is empty")
-                    print("    - MPD doesn't have permission to read music directory")
-                    print("    - Music directory path is incorrect in MPD config")
-                    return False
+            song_count = int(self.mpd.stats().get('songs', 0))
+            print(f"\n  Songs: {song_count}")
             
-            return True
-        except Exception as e:
+            if song_count > 0:
+                print("✓ Database updated successfully")
+                return True
+            else:
+                print("⚠ Database updated but no songs found")
+                print("  This may indicate:")
+                print("    - Music directory is empty")
+                print("    - MPD doesn't have permission to read music directory")
+                print("    - Music directory path is incorrect in MPD config")
+                return False
+        except MPDError as e:
             print(f"✗ Error updating database: {e}")
             return False
     
@@ -193,53 +201,40 @@ class DACTester:
         print("\n[5/5] Testing audio playback...")
         
         try:
-            # Clear playlist
-            subprocess.run(['mpc', 'clear'], timeout=5)
-            
-            # Add all music
+            # Clear the playlist, add all music and read it back in one round trip
             print("  Adding music to playlist...")
-            subprocess.run(['mpc', 'add', '/'], capture_output=True, timeout=10)
+            with self.mpd.command_list() as batch:
+                batch.clear()
+                batch.add('/')
+                batch.playlistinfo()
+            queue = batch.results[-1]
             
-            # Get playlist info
-            result = subprocess.run(['mpc', 'playlist'], 
-                                  capture_output=True, 
-                                  text=True,
-                                  timeout=5)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                track_count = len(result.stdout.strip().split('\n'))
-                print(f"✓ Playlist loaded with {track_count} track(s)")
+            if queue:
+                print(f"✓ Playlist loaded with {len(queue)} track(s)")
                 
-                # Play first track
+                # Play the first track and read back what MPD is doing
                 print("\n  Playing first track...")
-                subprocess.run(['mpc', 'play', '1'], timeout=5)
-                time.sleep(2)
+                with self.mpd.command_list() as batch:
+                    batch.play(0)
+                    batch.currentsong()
+                    batch.status()
+                _, song, status = batch.results
                 
-                # Get current status
-                result = subprocess.run(['mpc', 'current'], 
-                                      capture_output=True, 
-                                      text=True,
-                                      timeout=5)
-                if result.returncode == 0 and result.stdout.strip():
-                    print(f"  Now playing: {result.stdout.strip()}")
+                if song:
+                    print(f"  Now playing: {format_song(song)}")
                 
                 # Show status
-                result = subprocess.run(['mpc', 'status'], 
-                                      capture_output=True, 
-                                      text=True,
-                                      timeout=5)
-                if result.returncode == 0:
-                    print(f"\n  Status:")
-                    for line in result.stdout.strip().split('\n'):
-                        print(f"    {line}")
+                print(f"\n  Status:")
+                for line in format_status(status, song).split('\n'):
+                    print(f"    {line}")
                 
                 return True
             else:
                 print("✗ No tracks found in playlist")
                 print("  Make sure music files are in the MPD music directory")
                 return False
-                
-        except Exception as e:
+        
+        except MPDError as e:
             print(f"✗ Error during playback test: {e}")
             return False
     
@@ -264,80 +259,66 @@ class DACTester:
             while True:
                 cmd = input("\nCommand: ").strip().lower()
                 
-                if cmd == 'q':
-                    print("Stopping playback...")
-                    subprocess.run(['mpc', 'stop'], timeout=5)
-                    break
-                elif cmd == 'p':
-                    subprocess.run(['mpc', 'toggle'], timeout=5)
-                    result = subprocess.run(['mpc', 'status'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    if 'playing' in result.stdout.lower():
-                        print("▶ Playing")
+                try:
+                    if cmd == 'q':
+                        print("Stopping playback...")
+                        self.mpd.stop()
+                        break
+                    elif cmd == 'p':
+                        if self.mpd.toggle() == 'play':
+                            print("▶ Playing")
+                        else:
+                            print("⏸ Paused")
+                    elif cmd == 'n':
+                        with self.mpd.command_list() as batch:
+                            batch.next()
+                            batch.currentsong()
+                        print(f"⏭ {format_song(batch.results[1])}")
+                    elif cmd == 'b':
+                        with self.mpd.command_list() as batch:
+                            batch.previous()
+                            batch.currentsong()
+                        print(f"⏮ {format_song(batch.results[1])}")
+                    elif cmd == '+':
+                        print(f"🔊 volume: {self.mpd.change_volume(5)}%")
+                    elif cmd == '-':
+                        print(f"🔉 volume: {self.mpd.change_volume(-5)}%")
+                    elif cmd == 's':
+                        with self.mpd.command_list() as batch:
+                            batch.status()
+                            batch.currentsong()
+                        print(format_status(*batch.results))
+                    elif cmd == 'l':
+                        queue = self.mpd.playlistinfo()
+                        for i, song in enumerate(queue[:10], 1):
+                            print(f"  {i}. {format_song(song)}")
+                        if len(queue) > 10:
+                            print(f"  ... and {len(queue) - 10} more")
                     else:
-                        print("⏸ Paused")
-                elif cmd == 'n':
-                    subprocess.run(['mpc', 'next'], timeout=5)
-                    result = subprocess.run(['mpc', 'current'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    print(f"⏭ {result.stdout.strip()}")
-                elif cmd == 'b':
-                    subprocess.run(['mpc', 'prev'], timeout=5)
-                    result = subprocess.run(['mpc', 'current'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    print(f"⏮ {result.stdout.strip()}")
-                elif cmd == '+':
-                    subprocess.run(['mpc', 'volume', '+5'], timeout=5)
-                    result = subprocess.run(['mpc', 'volume'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    print(f"🔊 {result.stdout.strip()}")
-                elif cmd == '-':
-                    subprocess.run(['mpc', 'volume', '-5'], timeout=5)
-                    result = subprocess.run(['mpc', 'volume'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    print(f"🔉 {result.stdout.strip()}")
-                elif cmd == 's':
-                    result = subprocess.run(['mpc', 'status'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    print(result.stdout.strip())
-                elif cmd == 'l':
-                    result = subprocess.run(['mpc', 'playlist'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=5)
-                    lines = result.stdout.strip().split('\n')
-                    for i, line in enumerate(lines[:10], 1):
-                        print(f"  {i}. {line}")
-                    if len(lines) > 10:
-                        print(f"  ... and {len(lines) - 10} more")
-                else:
-                    print("Unknown command. Try: p, n, b, +, -, s, l, q")
-                    
+                        print("Unknown command. Try: p, n, b, +, -, s, l, q")
+                except MPDError as e:
+                    print(f"✗ MPD error: {e}")
+        
         except KeyboardInterrupt:
             print("\n\nStopping playback...")
-            subprocess.run(['mpc', 'stop'], timeout=5)
+            self.stop_playback()
+    
+    def stop_playback(self):
+        """Stop playback, ignoring errors (used on exit)"""
+        try:
+            self.mpd.stop()
+        except MPDError:
+            pass
     
     def run_full_test(self):
         """Run complete DAC HAT test"""
         print("=" * 60)
-        print("HiFi DAC HAT Test - MPD/MPC Playback Test")
+        print("HiFi DAC HAT Test - MPD Playback Test")
         print("=" * 60)
         
         # Run all checks
         checks = [
-            self.check_mpc_installed(),
+            self.check_mpd_connection(),
             self.check_mpd_running(),
             self.check_music_directory(),
             self.update_mpd_database(),
@@ -371,7 +352,7 @@ def run_test():
         return tester.run_full_test()
     except KeyboardInterrupt:
         print("\n\nTest interrupted by user")
-        subprocess.run(['mpc', 'stop'], timeout=5, stderr=subprocess.DEVNULL)
+        tester.stop_playback()
         return False
     except Exception as e:
         print(f"\nUnexpected error: {e}")
@@ -4,7 +4,12 @@ ST7789 controller, 240x240 resolution
 """
 
 from .lcd_driver import LCD_1in3, LCD_WIDTH, LCD_HEIGHT
+from .sprites import Sprite, SpriteAtlas
+from .stats import DisplayStats, LatencyHistogram
+from .virtual_panel import VirtualPanel
 from .lcd_test import run_test
+from .lcd_benchmark import run_benchmark
 
-__all__ = ['LCD_1in3', 'LCD_WIDTH', 'LCD_HEIGHT', 'run_test']
+__all__ = ['LCD_1in3', 'LCD_WIDTH', 'LCD_HEIGHT', 'DisplayStats', 'LatencyHistogram', 'Sprite',
+           'SpriteAtlas', 'VirtualPanel', 'run_test', 'run_benchmark']
 
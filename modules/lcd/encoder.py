@@ -0,0 +1,44 @@
+"""
+RGB565 frame encoder for the ST7789 controller
+
+Converts PIL RGB images into the packed big-endian RGB565 byte stream the
+panel expects, using Pillow's C-level point lookups instead of per-pixel
+Python arithmetic.
+"""
+
+from PIL import Image, ImageChops
+
+# Lookup tables for the two output bytes of each pixel:
+#   high byte = RRRRRGGG, low byte = GGGBBBBB
+# The R/G halves and G/B halves never overlap, so adding them is the same
+# as OR-ing them together.
+_HI_RED = [v & 0xF8 for v in range(256)]
+_HI_GREEN = [v >> 5 for v in range(256)]
+_LO_GREEN = [(v << 3) & 0xE0 for v in range(256)]
+_LO_BLUE = [v >> 3 for v in range(256)]
+
+
+def image_to_rgb565(image):
+    """
+    Encode a PIL image as big-endian RGB565.
+    
+    Args:
+        image: PIL Image of any size. Non-RGB images are converted first.
+    
+    Returns:
+        bytes of length width * height * 2, row-major, high byte first.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    r, g, b = image.split()
+    high = ImageChops.add(r.point(_HI_RED), g.point(_HI_GREEN))
+    low = ImageChops.add(g.point(_LO_GREEN), b.point(_LO_BLUE))
+    
+    # 'LA' packs two 8-bit bands per pixel, giving interleaved high/low bytes
+    return Image.merge('LA', (high, low)).tobytes()
+
+
+def rgb565_color(r, g, b):
+    """Pack a single (r, g, b) color into a 16-bit RGB565 value"""
+    return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
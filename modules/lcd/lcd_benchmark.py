@@ -0,0 +1,163 @@
+"""
+Benchmark for the LCD frame path
+
+Compares the original per-pixel Python encoder against the bulk RGB565
+encoder, then times full frames through the driver.
+"""
+
+import time
+from PIL import Image, ImageDraw
+from .encoder import image_to_rgb565, rgb565_color
+from .virtual_panel import VirtualPanel
+from .lcd_driver import (LCD_1in3, LCD_WIDTH, LCD_HEIGHT, SPI_SPEED, DC_PIN,
+                         CMD_CASET, CMD_RASET, CMD_RAMWR, ST7789_INIT_SEQUENCE)
+
+
+# Per-transfer sizes to compare: one scanline (the original driver), the
+# spidev default bufsiz, and larger limits configured via spidev.bufsiz
+CHUNK_SIZES = [LCD_WIDTH * 2, 4096, 16384, 65536]
+
+
+def legacy_encode(image):
+    """Reference per-pixel encoder (the driver's original implementation)"""
+    pix = image.load()
+    frame = []
+    for y in range(image.height):
+        for x in range(image.width):
+            rgb = rgb565_color(*pix[x, y])
+            frame.append(rgb >> 8)
+            frame.append(rgb & 0xFF)
+    return frame
+
+
+def legacy_send(lcd, cmd, params):
+    """Reference command writer: DC toggle and a 1-byte transfer per byte"""
+    lcd.GPIO.output(DC_PIN, lcd.GPIO.LOW)
+    lcd.spi.writebytes([cmd])
+    for value in params:
+        lcd.GPIO.output(DC_PIN, lcd.GPIO.HIGH)
+        lcd.spi.writebytes([value])
+    
+    # Bypassing the driver leaves its DC level and window caches stale
+    lcd._dc_level = None
+    lcd._window = None
+
+
+def legacy_init_commands(lcd):
+    """Send the init register table the original way (without the delays)"""
+    for cmd, params, _ in ST7789_INIT_SEQUENCE:
+        legacy_send(lcd, cmd, params)
+
+
+def batched_init_commands(lcd):
+    """Send the init register table with batched parameters (without the delays)"""
+    for cmd, params, _ in ST7789_INIT_SEQUENCE:
+        lcd.send_command(cmd, params)
+
+
+def legacy_full_window(lcd):
+    """Program a full-frame window the original way"""
+    legacy_send(lcd, CMD_CASET, [0, 0, 0, LCD_WIDTH - 1])
+    legacy_send(lcd, CMD_RASET, [0, 0, 0, LCD_HEIGHT - 1])
+    legacy_send(lcd, CMD_RAMWR, [])
+
+
+def cached_full_window(lcd):
+    """Program a full-frame window through the driver's window cache"""
+    lcd.set_window(0, 0, LCD_WIDTH, LCD_HEIGHT)
+
+
+def full_frame(args):
+    """Send a frame in full, bypassing the partial-update diff"""
+    lcd, image = args
+    lcd.invalidate()
+    lcd.display(image)
+
+
+def make_test_frame():
+    """Build a busy test frame so the encoders can't take shortcuts"""
+    image = Image.new('RGB', (LCD_WIDTH, LCD_HEIGHT), (20, 20, 30))
+    draw = ImageDraw.Draw(image)
+    for i in range(LCD_HEIGHT):
+        draw.line([(0, i), (LCD_WIDTH, i)], fill=(i, 255 - i, (i * 3) % 256))
+    draw.ellipse((60, 60, 180, 180), fill=(255, 255, 255))
+    draw.text((10, 10), "BENCHMARK", fill=(0, 0, 0))
+    return image
+
+
+def time_call(func, arg, iterations):
+    """Return the mean time of func(arg) in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def run_benchmark(iterations=20, virtual=False):
+    """
+    Time the frame encoder, the command path and full frames on the panel.
+    
+    Args:
+        iterations: Number of frames to time per measurement
+        virtual: If True, measure against a VirtualPanel instead of the HAT
+    """
+    image = make_test_frame()
+    
+    if bytes(legacy_encode(image)) != image_to_rgb565(image):
+        raise RuntimeError("Bulk encoder output does not match the reference encoder")
+    
+    print(f"Encoding {LCD_WIDTH}x{LCD_HEIGHT} frames ({iterations} iterations)...")
+    legacy_ms = time_call(legacy_encode, image, max(1, iterations // 10))
+    bulk_ms = time_call(image_to_rgb565, image, iterations)
+    print(f"  Per-pixel encoder: {legacy_ms:8.2f} ms/frame")
+    print(f"  Bulk encoder:      {bulk_ms:8.2f} ms/frame  ({legacy_ms / bulk_ms:.0f}x faster)")
+    
+    wire_ms = LCD_WIDTH * LCD_HEIGHT * 2 * 8 * 1000 / SPI_SPEED
+    print(f"  SPI wire time at {SPI_SPEED // 1000000} MHz: {wire_ms:.2f} ms/frame")
+    
+    # A large virtual bufsiz lets every chunk size below be measured
+    panel = VirtualPanel(bufsiz=max(CHUNK_SIZES)) if virtual else None
+    lcd = LCD_1in3(transport=panel)
+    lcd.init()
+    
+    print("\nCommand path...")
+    legacy_ms = time_call(legacy_init_commands, lcd, iterations)
+    batched_ms = time_call(batched_init_commands, lcd, iterations)
+    print(f"  Init table, per-byte:  {legacy_ms:8.3f} ms")
+    print(f"  Init table, batched:   {batched_ms:8.3f} ms")
+    legacy_ms = time_call(legacy_full_window, lcd, iterations * 10)
+    cached_ms = time_call(cached_full_window, lcd, iterations * 10)
+    print(f"  set_window, per-byte:  {legacy_ms:8.3f} ms")
+    print(f"  set_window, cached:    {cached_ms:8.3f} ms")
+    
+    print("\nPushing frames to the LCD...")
+    lcd.invalidate()
+    frame_ms = time_call(full_frame, (lcd, image), iterations)
+    print(f"  display(): {frame_ms:.2f} ms/frame ({1000 / frame_ms:.1f} FPS)")
+    if panel:
+        print(f"  Virtual panel traffic: {panel.stats()}")
+    
+    print(f"\nTransfer chunk sizes (bus limit {lcd.max_transfer} bytes)...")
+    detected = lcd.max_transfer
+    for size in CHUNK_SIZES:
+        if size > detected:
+            print(f"  {size:>6} bytes: skipped, above the bus limit")
+            continue
+        lcd.max_transfer = size
+        if panel:
+            panel.reset_counters()
+        frame_ms = time_call(full_frame, (lcd, image), iterations)
+        line = f"  {size:>6} bytes: {frame_ms:8.2f} ms/frame"
+        if panel:
+            line += f"  {panel.transactions // iterations} transfers/frame"
+        print(line)
+    lcd.max_transfer = detected
+    
+    lcd.clear()
+
+
+if __name__ == '__main__':
+    try:
+        run_benchmark()
+    except KeyboardInterrupt:
+        print("\nBenchmark interrupted by user")
@@ -4,8 +4,11 @@ ST7789 controller, 240x240 resolution
 """
 
 import time
-import spidev as SPI
-from PIL import Image
+import threading
+from PIL import Image, ImageChops
+from .encoder import image_to_rgb565
+from .transport import SpiTransport, DEFAULT_SPI_BUFSIZ
+from .stats import DisplayStats
 
 # LCD Configuration
 LCD_WIDTH = 240
@@ -22,19 +25,79 @@ SPI_BUS = 0
 SPI_DEVICE = 0
 SPI_SPEED = 40000000  # 40 MHz
 
+# ST7789 command opcodes
+CMD_CASET = 0x2A   # Column address set
+CMD_RASET = 0x2B   # Row address set
+CMD_RAMWR = 0x2C   # Memory write
+CMD_MADCTL = 0x36  # Memory data access control
+CMD_COLMOD = 0x3A  # Interface pixel format
+
+# MADCTL bits
+MADCTL_MY = 0x80  # Row address order
+MADCTL_MX = 0x40  # Column address order
+MADCTL_MV = 0x20  # Row/column exchange
+MADCTL_ML = 0x10  # Vertical refresh order
+
+# MADCTL for each clockwise rotation (degrees) relative to the HAT's default
+# orientation. The controller has 320 rows of frame memory but the glass only
+# shows the first 240, so when row order is reversed (MY) the window must be
+# offset by the difference.
+ROTATION_MADCTL = {
+    0: MADCTL_MX | MADCTL_MV | MADCTL_ML,
+    90: MADCTL_MY | MADCTL_MX | MADCTL_ML,
+    180: MADCTL_MY | MADCTL_MV | MADCTL_ML,
+    270: MADCTL_ML,
+}
+RAM_ROWS = 320
+
+# Power-on register sequence: (command, parameter bytes, delay after in seconds)
+ST7789_INIT_SEQUENCE = [
+    (CMD_MADCTL, bytes([ROTATION_MADCTL[0]]), 0),  # Replaced by the rotation setting
+    (CMD_COLMOD, b'\x05', 0),                     # 16 bits/pixel
+    (0xB2, b'\x0C\x0C\x00\x33\x33', 0),             # Porch control
+    (0xB7, b'\x35', 0),                           # Gate control
+    (0xBB, b'\x19', 0),                           # VCOM
+    (0xC0, b'\x2C', 0),                           # LCM control
+    (0xC2, b'\x01', 0),                           # VDV/VRH enable
+    (0xC3, b'\x12', 0),                           # VRH
+    (0xC4, b'\x20', 0),                           # VDV
+    (0xC6, b'\x0F', 0),                           # Frame rate
+    (0xD0, b'\xA4\xA1', 0),                        # Power control
+    (0xE0, bytes([0xD0, 0x04, 0x0D, 0x11, 0x13, 0x2B, 0x3F,
+                  0x54, 0x4C, 0x18, 0x0D, 0x0B, 0x1F, 0x23]), 0),  # Positive gamma
+    (0xE1, bytes([0xD0, 0x04, 0x0C, 0x11, 0x13, 0x2C, 0x3F,
+                  0x44, 0x51, 0x2F, 0x1F, 0x1F, 0x20, 0x23]), 0),  # Negative gamma
+    (0x21, b'', 0),                               # Display inversion on
+    (0x11, b'', 0.12),                            # Sleep out
+    (0x29, b'', 0),                               # Display on
+]
+
+# Partial refresh: rows are diffed in bands of this height so that changes
+# far apart on screen (e.g. title and progress bar) go out as separate windows
+DIFF_BAND_HEIGHT = 16
+
 
 class LCD_1in3:
     """Driver class for Waveshare 1.3inch LCD HAT with ST7789 controller"""
     
-    def __init__(self, setup_buttons=False):
+    def __init__(self, setup_buttons=False, transport=None, rotation=0, mirror=False):
         """
         Initialize the LCD driver.
         
         Args:
             setup_buttons: If True, configure GPIO for the HAT's buttons and joystick.
                           Only needed if you're using the input controls.
+            transport: Object providing `gpio` and `spi` (see transport.py).
+                       Defaults to the real HAT via RPi.GPIO and spidev.
+            rotation: Clockwise rotation of the picture in degrees (0, 90, 180, 270).
+                      Done by the panel (MADCTL), so frames are never copied.
+            mirror: If True, mirror each frame left-to-right before it is rotated
         """
-        import RPi.GPIO as GPIO
+        if transport is None:
+            transport = SpiTransport(SPI_BUS, SPI_DEVICE, SPI_SPEED)
+        self.transport = transport
+        
+        GPIO = transport.gpio
         self.GPIO = GPIO
         self.GPIO.setmode(GPIO.BCM)
         self.GPIO.setwarnings(False)
@@ -50,10 +113,34 @@ class LCD_1in3:
             for pin in [KEY1, KEY2, KEY3, JOY_UP, JOY_DOWN, JOY_LEFT, JOY_RIGHT, JOY_PRESS]:
                 self.GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         
-        self.spi = SPI.SpiDev(SPI_BUS, SPI_DEVICE)
-        self.spi.max_speed_hz = SPI_SPEED
-        self.spi.mode = 0b00
+        self.spi = transport.spi
+        
+        # Frame data is split into transfers of at most this many bytes
+        self.max_transfer = getattr(transport, 'max_transfer', DEFAULT_SPI_BUFSIZ)
+        
+        # Current level of the DC pin (None = unknown) and the last window
+        # programmed with CASET/RASET, so redundant writes can be skipped
+        self._dc_level = None
+        self._window = None
+        
+        self._configure_rotation(rotation, mirror)
+        self._initialized = False
+        
+        # Per-stage timings and traffic counters
+        self.stats = DisplayStats()
         
+        # Last frame sent to the panel, used to diff partial updates
+        self.last_image = None
+        
+        # Background flush worker (see start_flush_thread)
+        self._flush_thread = None
+        self._flush_cond = threading.Condition()
+        self._pending = None
+        self._flush_running = False
+        self._flush_busy = False
+        self._flush_error = None
+        self.frames_dropped = 0
+    
     def reset(self):
         """Hardware reset of the LCD"""
         self.GPIO.output(RST_PIN, self.GPIO.HIGH)
@@ -62,130 +149,321 @@ class LCD_1in3:
         time.sleep(0.01)
         self.GPIO.output(RST_PIN, self.GPIO.HIGH)
         time.sleep(0.01)
-        
+    
+    def _set_dc(self, level):
+        """Drive the DC pin, skipping the GPIO write if it's already at level"""
+        if self._dc_level != level:
+            self.GPIO.output(DC_PIN, level)
+            self._dc_level = level
+    
     def write_cmd(self, cmd):
         """Write a command to the LCD"""
-        self.GPIO.output(DC_PIN, self.GPIO.LOW)
+        self._set_dc(self.GPIO.LOW)
         self.spi.writebytes([cmd])
-        
+    
     def write_data(self, data):
         """Write data to the LCD"""
-        self.GPIO.output(DC_PIN, self.GPIO.HIGH)
+        self._set_dc(self.GPIO.HIGH)
         self.spi.writebytes([data])
+    
+    def send_command(self, cmd, params=b''):
+        """Write a command followed by all of its parameters in one transfer"""
+        self.write_cmd(cmd)
+        if params:
+            self._set_dc(self.GPIO.HIGH)
+            self.spi.writebytes(list(params))
+    
+    def write_buffer(self, data):
+        """
+        Send a block of pixel data in the largest transfers the bus allows.
         
+        Slices are zero-copy memoryviews. If the bus rejects a transfer size
+        (e.g. a misreported bufsiz), drop back to the spidev default and retry.
+        """
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            chunk = view[offset:offset + self.max_transfer]
+            try:
+                if hasattr(self.spi, 'writebytes2'):
+                    self.spi.writebytes2(chunk)
+                else:
+                    # spidev < 3.5 only takes lists
+                    self.spi.writebytes(chunk.tolist())
+            except OSError:
+                if self.max_transfer <= DEFAULT_SPI_BUFSIZ:
+                    raise
+                self.max_transfer = DEFAULT_SPI_BUFSIZ
+                continue
+            offset += len(chunk)
+    
     def init(self):
         """Initialize the LCD with ST7789 register settings"""
         self.reset()
         
-        self.write_cmd(0x36)
-        self.write_data(0x70)
-        
-        self.write_cmd(0x3A)
-        self.write_data(0x05)
-        
-        self.write_cmd(0xB2)
-        self.write_data(0x0C)
-        self.write_data(0x0C)
-        self.write_data(0x00)
-        self.write_data(0x33)
-        self.write_data(0x33)
-        
-        self.write_cmd(0xB7)
-        self.write_data(0x35)
-        
-        self.write_cmd(0xBB)
-        self.write_data(0x19)
-        
-        self.write_cmd(0xC0)
-        self.write_data(0x2C)
-        
-        self.write_cmd(0xC2)
-        self.write_data(0x01)
-        
-        self.write_cmd(0xC3)
-        self.write_data(0x12)
-        
-        self.write_cmd(0xC4)
-        self.write_data(0x20)
-        
-        self.write_cmd(0xC6)
-        self.write_data(0x0F)
-        
-        self.write_cmd(0xD0)
-        self.write_data(0xA4)
-        self.write_data(0xA1)
-        
-        self.write_cmd(0xE0)
-        self.write_data(0xD0)
-        self.write_data(0x04)
-        self.write_data(0x0D)
-        self.write_data(0x11)
-        self.write_data(0x13)
-        self.write_data(0x2B)
-        self.write_data(0x3F)
-        self.write_data(0x54)
-        self.write_data(0x4C)
-        self.write_data(0x18)
-        self.write_data(0x0D)
-        self.write_data(0x0B)
-        self.write_data(0x1F)
-        self.write_data(0x23)
-        
-        self.write_cmd(0xE1)
-        self.write_data(0xD0)
-        self.write_data(0x04)
-        self.write_data(0x0C)
-        self.write_data(0x11)
-        self.write_data(0x13)
-        self.write_data(0x2C)
-        self.write_data(0x3F)
-        self.write_data(0x44)
-        self.write_data(0x51)
-        self.write_data(0x2F)
-        self.write_data(0x1F)
-        self.write_data(0x1F)
-        self.write_data(0x20)
-        self.write_data(0x23)
-        
-        self.write_cmd(0x21)
-        
-        self.write_cmd(0x11)
-        time.sleep(0.12)
-        
-        self.write_cmd(0x29)
+        # Reset clears the panel's address window
+        self._window = None
+        
+        for cmd, params, delay in ST7789_INIT_SEQUENCE:
+            if cmd == CMD_MADCTL:
+                params = bytes([self.madctl])
+            self.send_command(cmd, params)
+            if delay:
+                time.sleep(delay)
+        
+        # Panel RAM contents are undefined after a reset
+        self.invalidate()
+        self._initialized = True
+    
+    def _configure_rotation(self, rotation, mirror):
+        """Work out the MADCTL value and window offsets for an orientation"""
+        if rotation not in ROTATION_MADCTL:
+            raise ValueError(f"Unsupported rotation {rotation}; use 0, 90, 180 or 270")
+        
+        madctl = ROTATION_MADCTL[rotation]
+        if mirror:
+            # Flip whichever address counter the picture's x axis drives
+            madctl ^= MADCTL_MY if madctl & MADCTL_MV else MADCTL_MX
+        
+        # Reversed row order puts the visible rows at the end of frame memory;
+        # rows are driven by x when MV exchanges the axes
+        offset = RAM_ROWS - LCD_HEIGHT if madctl & MADCTL_MY else 0
+        self.x_offset, self.y_offset = (offset, 0) if madctl & MADCTL_MV else (0, offset)
         
+        self.rotation = rotation
+        self.mirror = mirror
+        self.madctl = madctl
+    
+    def set_rotation(self, rotation, mirror=False):
+        """
+        Change the picture orientation.
+        
+        Takes effect immediately if the panel is initialized. The next
+        display() is sent in full since the old contents are now misplaced.
+        """
+        self._configure_rotation(rotation, mirror)
+        if self._initialized:
+            self.send_command(CMD_MADCTL, bytes([self.madctl]))
+            self._window = None
+            self.invalidate()
+    
     def set_window(self, x_start, y_start, x_end, y_end):
-        """Set the drawing window for the LCD"""
-        self.write_cmd(0x2A)
-        self.write_data(0x00)
-        self.write_data(x_start)
-        self.write_data(0x00)
-        self.write_data(x_end - 1)
-        
-        self.write_cmd(0x2B)
-        self.write_data(0x00)
-        self.write_data(y_start)
-        self.write_data(0x00)
-        self.write_data(y_end - 1)
-        
-        self.write_cmd(0x2C)
-        
-    def display(self, image):
-        """Display a PIL Image on the LCD"""
-        img = image.rotate(0)
-        pix = img.load()
-        self.set_window(0, 0, LCD_WIDTH, LCD_HEIGHT)
-        self.GPIO.output(DC_PIN, self.GPIO.HIGH)
-        
-        for y in range(LCD_HEIGHT):
-            line = []
-            for x in range(LCD_WIDTH):
-                r, g, b = pix[x, y]
-                rgb = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-                line.append(rgb >> 8)
-                line.append(rgb & 0xFF)
-            self.spi.writebytes(line)
+        """Set the drawing window for the LCD and start a memory write"""
+        window = (x_start, y_start, x_end, y_end)
+        if window != self._window:
+            x0, x1 = x_start + self.x_offset, x_end - 1 + self.x_offset
+            y0, y1 = y_start + self.y_offset, y_end - 1 + self.y_offset
+            self.send_command(CMD_CASET, bytes([x0 >> 8, x0 & 0xFF, x1 >> 8, x1 & 0xFF]))
+            self.send_command(CMD_RASET, bytes([y0 >> 8, y0 & 0xFF, y1 >> 8, y1 & 0xFF]))
+            self._window = window
+        
+        # RAMWR restarts the write at the window origin, so it's always needed
+        self.write_cmd(CMD_RAMWR)
+    
+    def invalidate(self):
+        """Forget the last frame so the next display() sends a full refresh"""
+        self.last_image = None
+    
+    def changed_regions(self, image):
+        """
+        Compute the regions of image that differ from the last frame sent.
+        
+        Rows are compared in bands of DIFF_BAND_HEIGHT; consecutive dirty
+        bands are merged into one box.
+        
+        Returns:
+            List of (x_start, y_start, x_end, y_end) boxes, ends exclusive.
+            Empty if nothing changed.
+        """
+        diff = ImageChops.difference(self.last_image, image)
+        if diff.getbbox() is None:
+            return []
+        
+        regions = []
+        for top in range(0, LCD_HEIGHT, DIFF_BAND_HEIGHT):
+            bottom = min(top + DIFF_BAND_HEIGHT, LCD_HEIGHT)
+            bbox = diff.crop((0, top, LCD_WIDTH, bottom)).getbbox()
+            if bbox is None:
+                continue
+            x0, y0, x1, y1 = bbox[0], top + bbox[1], bbox[2], top + bbox[3]
             
+            # Merge with the previous box if it ends in the band just above
+            if regions and regions[-1][3] >= top:
+                px0, py0, px1, _ = regions[-1]
+                regions[-1] = (min(px0, x0), py0, max(px1, x1), y1)
+            else:
+                regions.append((x0, y0, x1, y1))
+        return regions
+    
+    def write_region(self, image, region):
+        """Send one rectangular region of image to the same area of the panel"""
+        x0, y0, x1, y1 = region
+        self.set_window(x0, y0, x1, y1)
+        self._set_dc(self.GPIO.HIGH)
+        
+        start = time.perf_counter()
+        data = image_to_rgb565(image.crop(region))
+        encoded = time.perf_counter()
+        
+        self.write_buffer(data)
+        
+        self.stats.record('encode', encoded - start)
+        self.stats.record('transfer', time.perf_counter() - encoded)
+        self.stats.count('bytes_sent', len(data))
+        self.stats.count('regions')
+    
+    def display(self, image, regions=None):
+        """
+        Display a PIL Image on the LCD.
+        
+        Only the parts of the panel that changed are transferred. The first
+        frame (and the first after init() or invalidate()) is always sent
+        in full.
+        
+        Args:
+            image: 240x240 PIL Image
+            regions: Optional list of (x_start, y_start, x_end, y_end) boxes
+                     known to have changed. If None, they are computed by
+                     diffing against the last frame.
+        """
+        start = time.perf_counter()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        full = (0, 0, LCD_WIDTH, LCD_HEIGHT)
+        if self.last_image is None:
+            regions = [full]
+        elif regions is None:
+            regions = self.changed_regions(image)
+        
+        sent = 0
+        for x0, y0, x1, y1 in regions:
+            region = (max(0, x0), max(0, y0), min(LCD_WIDTH, x1), min(LCD_HEIGHT, y1))
+            if region[0] < region[2] and region[1] < region[3]:
+                self.write_region(image, region)
+                sent += 1
+        
+        self.last_image = image.copy()
+        
+        if not sent:
+            self.stats.count('frames_unchanged')
+        elif regions == [full]:
+            self.stats.count('frames_full')
+        else:
+            self.stats.count('frames_partial')
+        self.stats.record('frame', time.perf_counter() - start)
+    
+    def start_flush_thread(self):
+        """
+        Start a background worker that sends frames given to submit().
+        
+        While the worker is running, frames should only be sent through
+        submit() so the worker has exclusive use of the SPI bus.
+        """
+        if self._flush_thread is not None:
+            return
+        self._flush_running = True
+        self._flush_thread = threading.Thread(target=self._flush_loop,
+                                              name='lcd-flush', daemon=True)
+        self._flush_thread.start()
+    
+    def stop_flush_thread(self):
+        """
+        Send any pending frame, then stop the background worker.
+        
+        Raises the error that stopped the worker, if it failed.
+        """
+        if self._flush_thread is None:
+            return
+        with self._flush_cond:
+            self._flush_running = False
+            self._flush_cond.notify_all()
+        self._flush_thread.join()
+        self._flush_thread = None
+        self._raise_flush_error()
+    
+    def _raise_flush_error(self):
+        """Re-raise (once) an exception that stopped the flush worker"""
+        error, self._flush_error = self._flush_error, None
+        if error is not None:
+            if self._flush_thread is not None:
+                self._flush_thread.join()
+                self._flush_thread = None
+            raise error
+    
+    def submit(self, image, regions=None):
+        """
+        Queue a frame for the background worker and return immediately.
+        
+        If a previous frame is still waiting to be sent it is replaced, so
+        the panel always shows the newest frame when SPI can't keep up.
+        The image must not be modified after it has been submitted.
+        If the worker failed to send an earlier frame, its exception is
+        raised here and the worker is gone: later frames are sent
+        synchronously, as without start_flush_thread().
+        
+        Args:
+            image: 240x240 PIL Image
+            regions: Optional changed regions, as for display()
+        """
+        self._raise_flush_error()
+        if self._flush_thread is None:
+            self.display(image, regions)
+            return
+        
+        with self._flush_cond:
+            if self._pending is not None:
+                self.frames_dropped += 1
+                # The dropped frame's changes must still reach the panel
+                _, pending_regions = self._pending
+                if regions is not None and pending_regions is not None:
+                    regions = pending_regions + list(regions)
+                else:
+                    regions = None
+            self._pending = (image, regions)
+            self._flush_cond.notify_all()
+    
+    def wait_flushed(self, timeout=None):
+        """
+        Block until every submitted frame has been sent to the panel.
+        
+        Raises the worker's exception if sending a frame failed.
+        """
+        with self._flush_cond:
+            flushed = self._flush_cond.wait_for(
+                lambda: (self._pending is None and not self._flush_busy)
+                        or self._flush_error is not None, timeout)
+        self._raise_flush_error()
+        return flushed
+    
+    def _flush_loop(self):
+        """Worker thread: send the newest pending frame whenever there is one"""
+        while True:
+            with self._flush_cond:
+                self._flush_cond.wait_for(
+                    lambda: self._pending is not None or not self._flush_running)
+                if self._pending is None:
+                    return
+                image, regions = self._pending
+                self._pending = None
+                self._flush_busy = True
+            try:
+                self.display(image, regions)
+            except Exception as e:
+                # Hand the error to the next submit()/wait_flushed() and stop;
+                # what reached the panel is unknown, so resend in full later
+                with self._flush_cond:
+                    self._flush_error = e
+                    self._flush_running = False
+                    self._flush_busy = False
+                    self._pending = None
+                    self.last_image = None
+                    self._flush_cond.notify_all()
+                return
+            with self._flush_cond:
+                self._flush_busy = False
+                self._flush_cond.notify_all()
+    
     def clear(self):
         """Clear the LCD by filling it with black"""
         image = Image.new('RGB', (LCD_WIDTH, LCD_HEIGHT), (0, 0, 0))
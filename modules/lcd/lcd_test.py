@@ -5,20 +5,29 @@ Test suite for the LCD module
 import time
 from PIL import Image, ImageDraw, ImageFont
 from .lcd_driver import LCD_1in3, LCD_WIDTH, LCD_HEIGHT
+from .virtual_panel import VirtualPanel
 
 
-def run_test():
+def run_test(virtual=False):
     """
     Run comprehensive LCD tests including color fills, shapes, and text rendering.
     
+    Args:
+        virtual: If True, drive a VirtualPanel instead of the real HAT
+    
     This test will:
     1. Initialize the LCD
     2. Display solid color fills (red, green, blue, white)
     3. Draw shapes (rectangle, ellipse) and text
     4. Clear the display
     """
-    print("Initializing 1.3inch LCD HAT...")
-    lcd = LCD_1in3()
+    panel = None
+    if virtual:
+        print("Initializing virtual 1.3inch LCD panel...")
+        panel = VirtualPanel()
+    else:
+        print("Initializing 1.3inch LCD HAT...")
+    lcd = LCD_1in3(transport=panel)
     lcd.init()
     
     print("Running LCD test...")
@@ -54,6 +63,9 @@ def run_test():
     print("Clearing display...")
     lcd.clear()
     print("LCD test done!")
+    
+    if panel:
+        print(f"Virtual panel traffic: {panel.stats()}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+"""
+Sprite atlas
+
+Fixed UI elements (icons, glyphs, buttons) are rasterized once into opaque
+PIL tiles and pasted into frames as they are composed, instead of being
+redrawn with ImageDraw every time.
+"""
+
+from PIL import Image, ImageDraw
+
+
+class Sprite:
+    """An opaque, pre-rasterized image tile"""
+    
+    __slots__ = ('name', 'image')
+    
+    def __init__(self, name, image):
+        self.name = name
+        self.image = image.convert('RGB') if image.mode != 'RGB' else image
+    
+    @property
+    def size(self):
+        return self.image.size
+
+
+class SpriteAtlas:
+    """
+    Named collection of sprites.
+    
+    Example:
+        atlas = SpriteAtlas()
+        atlas.render('dot', (9, 9), lambda draw: draw.ellipse((0, 0, 8, 8), fill='white'))
+        atlas.paste(frame, 'dot', (10, 10))  # while composing a frame
+    """
+    
+    def __init__(self):
+        self.sprites = {}
+    
+    def __getitem__(self, name):
+        return self.sprites[name]
+    
+    def __contains__(self, name):
+        return name in self.sprites
+    
+    def add(self, name, image):
+        """Add a sprite from an existing image and return it"""
+        sprite = Sprite(name, image)
+        self.sprites[name] = sprite
+        return sprite
+    
+    def render(self, name, size, draw_func, background=(0, 0, 0)):
+        """
+        Rasterize a sprite once with ImageDraw and return it.
+        
+        Args:
+            name: Sprite name
+            size: (width, height) of the tile
+            draw_func: Called with an ImageDraw for the tile
+            background: Fill color under the drawing (tiles are opaque)
+        """
+        image = Image.new('RGB', size, background)
+        draw_func(ImageDraw.Draw(image))
+        return self.add(name, image)
+    
+    def paste(self, image, name, xy):
+        """Paste a sprite into a PIL image at xy"""
+        image.paste(self.sprites[name].image, xy)
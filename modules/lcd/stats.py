@@ -0,0 +1,115 @@
+"""
+Display-path instrumentation
+
+Fixed-size latency histograms and counters for the render -> encode ->
+transfer pipeline. Recording a sample is a couple of integer operations,
+so the stats are always on.
+"""
+
+import time
+
+# Histogram buckets are powers of two in microseconds: bucket i holds samples
+# in [2^(i-1), 2^i) us, so 24 buckets reach ~8 s
+NUM_BUCKETS = 24
+
+
+class LatencyHistogram:
+    """Log2-bucketed latency histogram with constant-time updates"""
+    
+    def __init__(self):
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds):
+        """Add one sample, in seconds"""
+        index = min(int(seconds * 1000000).bit_length(), NUM_BUCKETS - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, p):
+        """
+        Approximate the p-th percentile (0-100) in seconds.
+        
+        Returns the upper edge of the bucket containing the percentile,
+        capped at the largest sample seen.
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100.0
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target and n:
+                return min((1 << index) / 1000000.0, self.max)
+        return self.max
+    
+    @property
+    def mean(self):
+        """Mean sample in seconds"""
+        return self.total / self.count if self.count else 0.0
+    
+    def summary(self):
+        """Return count, mean, p50, p99 and max (times in ms) as a dict"""
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean * 1000, 3),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class DisplayStats:
+    """Per-stage timings and frame/byte counters for the display path"""
+    
+    STAGES = ('render', 'encode', 'transfer', 'frame')
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """Clear all histograms and counters"""
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.counters = {
+            'frames_full': 0,
+            'frames_partial': 0,
+            'frames_unchanged': 0,
+            'regions': 0,
+            'bytes_sent': 0,
+        }
+        self.started = time.monotonic()
+    
+    def record(self, stage, seconds):
+        """Add a timing sample for a stage (render, encode, transfer, frame)"""
+        self.histograms[stage].record(seconds)
+    
+    def count(self, counter, n=1):
+        """Increase a counter"""
+        self.counters[counter] += n
+    
+    def format(self):
+        """Return a human-readable multi-line summary"""
+        elapsed = time.monotonic() - self.started
+        lines = [f"Display stats over {elapsed:.1f} s:"]
+        lines.append(f"  {'stage':<10}{'count':>8}{'mean':>10}{'p50':>10}{'p99':>10}{'max':>10}  (ms)")
+        for stage in self.STAGES:
+            s = self.histograms[stage].summary()
+            if not s['count']:
+                continue
+            lines.append(f"  {stage:<10}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+                         f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        for name, value in self.counters.items():
+            lines.append(f"  {name:<18}{value:>10}")
+        return "\n".join(lines)
+    
+    def as_dict(self):
+        """Return all stats as a JSON-serializable dict"""
+        return {
+            'stages': {stage: h.summary() for stage, h in self.histograms.items()},
+            'counters': dict(self.counters),
+        }
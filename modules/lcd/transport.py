@@ -0,0 +1,54 @@
+"""
+Transports for the LCD driver
+
+A transport gives LCD_1in3 two things:
+    gpio - an RPi.GPIO compatible object for the RST/DC/BL pins and buttons
+    spi  - a spidev.SpiDev compatible object for the SPI bus
+
+and may provide:
+    max_transfer - the largest single SPI transfer the bus accepts, in bytes
+
+SpiTransport talks to the real HAT. See virtual_panel.VirtualPanel for a
+software stand-in that runs on any machine.
+"""
+
+# spidev's default per-transfer buffer size; the kernel rejects larger writes
+DEFAULT_SPI_BUFSIZ = 4096
+SPIDEV_BUFSIZ_PATH = '/sys/module/spidev/parameters/bufsiz'
+
+
+def detect_spi_bufsiz(path=SPIDEV_BUFSIZ_PATH):
+    """
+    Read the spidev per-transfer size limit.
+    
+    Can be raised with `spidev.bufsiz=65536` in /boot/cmdline.txt.
+    Falls back to the kernel default if the parameter can't be read.
+    """
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return DEFAULT_SPI_BUFSIZ
+
+
+class SpiTransport:
+    """Hardware transport using RPi.GPIO and spidev"""
+    
+    def __init__(self, bus, device, speed, mode=0b00):
+        """
+        Open the SPI device.
+        
+        Args:
+            bus: SPI bus number
+            device: SPI chip select on that bus
+            speed: SPI clock in Hz
+            mode: SPI mode (clock polarity/phase)
+        """
+        import RPi.GPIO as GPIO
+        import spidev
+        
+        self.gpio = GPIO
+        self.spi = spidev.SpiDev(bus, device)
+        self.spi.max_speed_hz = speed
+        self.spi.mode = mode
+        self.max_transfer = detect_spi_bufsiz()
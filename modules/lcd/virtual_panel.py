@@ -0,0 +1,230 @@
+"""
+Virtual ST7789 panel
+
+A software transport for LCD_1in3 that decodes the SPI command stream the
+driver sends (CASET, RASET, RAMWR, MADCTL, COLMOD) into an in-memory
+framebuffer and counts bytes and transactions. Lets the LCD test and the
+music player run headless, and makes throughput measurements repeatable.
+
+Example:
+    panel = VirtualPanel()
+    lcd = LCD_1in3(transport=panel)
+    lcd.init()
+    lcd.display(image)
+    panel.image().save('frame.png')
+"""
+
+import errno
+from array import array
+from PIL import Image
+from .lcd_driver import (LCD_WIDTH, LCD_HEIGHT, DC_PIN, RST_PIN, RAM_ROWS,
+                         CMD_CASET, CMD_RASET, CMD_RAMWR, CMD_MADCTL, CMD_COLMOD,
+                         MADCTL_MY, MADCTL_MX, MADCTL_MV)
+from .transport import DEFAULT_SPI_BUFSIZ
+
+# Pillow < 9.1 has the transpose methods on Image itself
+Transpose = getattr(Image, 'Transpose', Image)
+
+# ST7789 frame memory is 240 columns x 320 rows; the 1.3" glass shows rows 0-239
+RAM_COLUMNS = 240
+
+
+class VirtualGPIO:
+    """Minimal RPi.GPIO stand-in that records output levels"""
+    
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_UP = 22
+    
+    def __init__(self, on_output=None):
+        self.levels = {}
+        self.on_output = on_output
+    
+    def setmode(self, mode):
+        pass
+    
+    def setwarnings(self, flag):
+        pass
+    
+    def setup(self, pin, direction, pull_up_down=None):
+        if direction == self.IN:
+            # Inputs are pulled up, i.e. buttons read as released
+            self.levels[pin] = self.HIGH
+    
+    def output(self, pin, level):
+        previous = self.levels.get(pin)
+        self.levels[pin] = level
+        if self.on_output:
+            self.on_output(pin, previous, level)
+    
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+    
+    def cleanup(self):
+        self.levels.clear()
+
+
+class VirtualSPI:
+    """
+    spidev.SpiDev stand-in that forwards every transfer to a VirtualPanel.
+    
+    Like the kernel driver, writebytes() rejects transfers over bufsiz and
+    writebytes2() splits its buffer into bufsiz-sized transfers.
+    """
+    
+    def __init__(self, panel, bufsiz):
+        self.panel = panel
+        self.bufsiz = bufsiz
+        self.max_speed_hz = 0
+        self.mode = 0
+    
+    def writebytes(self, data):
+        if len(data) > self.bufsiz:
+            raise OSError(errno.EMSGSIZE, "Message too long")
+        self.panel.receive(bytes(data))
+    
+    def writebytes2(self, data):
+        view = memoryview(data)
+        for offset in range(0, len(view), self.bufsiz):
+            self.panel.receive(view[offset:offset + self.bufsiz])
+    
+    def close(self):
+        pass
+
+
+class VirtualPanel:
+    """Transport that emulates an ST7789 panel in memory"""
+    
+    def __init__(self, bufsiz=DEFAULT_SPI_BUFSIZ):
+        """
+        Args:
+            bufsiz: Emulated spidev per-transfer limit in bytes
+        """
+        self.gpio = VirtualGPIO(on_output=self._on_gpio)
+        self.spi = VirtualSPI(self, bufsiz)
+        self.max_transfer = bufsiz
+        self.reset_counters()
+        self._power_on()
+    
+    def reset_counters(self):
+        """Zero the traffic counters"""
+        self.bytes_sent = 0
+        self.transactions = 0
+        self.commands = 0
+        self.pixels_written = 0
+    
+    def _power_on(self):
+        """Controller state after power-on or a hardware reset"""
+        self.ram = Image.new('RGB', (RAM_COLUMNS, RAM_ROWS), (0, 0, 0))
+        self.madctl = 0x00
+        self.colmod = 0x66
+        self.columns = (0, RAM_COLUMNS - 1)
+        self.rows = (0, RAM_ROWS - 1)
+        self._command = None
+        self._params = bytearray()
+        self._pixels = bytearray()
+    
+    def _on_gpio(self, pin, previous, level):
+        if pin == RST_PIN and previous == VirtualGPIO.LOW and level == VirtualGPIO.HIGH:
+            self._power_on()
+    
+    def receive(self, data):
+        """Interpret one SPI transfer according to the current DC level"""
+        self.transactions += 1
+        self.bytes_sent += len(data)
+        
+        if self.gpio.levels.get(DC_PIN) == VirtualGPIO.LOW:
+            for cmd in bytes(data):
+                self._begin_command(cmd)
+        elif self._command == CMD_RAMWR:
+            self._pixels += data
+        else:
+            self._params += data
+            self._apply_params()
+    
+    def _begin_command(self, cmd):
+        self._flush_pixels()
+        self.commands += 1
+        self._command = cmd
+        self._params = bytearray()
+    
+    def _apply_params(self):
+        params = self._params
+        if self._command == CMD_CASET and len(params) >= 4:
+            self.columns = ((params[0] << 8) | params[1], (params[2] << 8) | params[3])
+        elif self._command == CMD_RASET and len(params) >= 4:
+            self.rows = ((params[0] << 8) | params[1], (params[2] << 8) | params[3])
+        elif self._command == CMD_MADCTL and params:
+            self.madctl = params[0]
+        elif self._command == CMD_COLMOD and params:
+            self.colmod = params[0]
+    
+    def _flush_pixels(self):
+        """Decode buffered RAMWR data (16-bit RGB565) into frame memory"""
+        if not self._pixels:
+            return
+        data, self._pixels = self._pixels, bytearray()
+        
+        x0, x1 = self.columns
+        y0, y1 = self.rows
+        width, height = x1 - x0 + 1, y1 - y0 + 1
+        if width <= 0 or height <= 0:
+            return
+        
+        # The write pointer wraps back to the window origin once it's full
+        stride = width * 2
+        window_bytes = stride * height
+        for start in range(0, len(data), window_bytes):
+            chunk = data[start:start + window_bytes]
+            rows = len(chunk) // stride
+            tail = (len(chunk) % stride) // 2
+            self.pixels_written += rows * width + tail
+            
+            if rows:
+                self._paste(chunk[:rows * stride], x0, y0, width, rows)
+            if tail:
+                self._paste(chunk[rows * stride:rows * stride + tail * 2], x0, y0 + rows, tail, 1)
+    
+    def _paste(self, data, x, y, width, height):
+        """Place a block given in window coordinates into frame memory"""
+        # Pillow's BGR;16 unpacker reads little-endian RGB565
+        swapped = array('H', bytes(data))
+        swapped.byteswap()
+        block = Image.frombytes('RGB', (width, height), swapped.tobytes(), 'raw', 'BGR;16')
+        
+        col, row = x, y
+        if self.madctl & MADCTL_MV:
+            block = block.transpose(Transpose.TRANSPOSE)
+            col, row = y, x
+        if self.madctl & MADCTL_MX:
+            block = block.transpose(Transpose.FLIP_LEFT_RIGHT)
+            col = RAM_COLUMNS - col - block.width
+        if self.madctl & MADCTL_MY:
+            block = block.transpose(Transpose.FLIP_TOP_BOTTOM)
+            row = RAM_ROWS - row - block.height
+        self.ram.paste(block, (col, row))
+    
+    def image(self):
+        """
+        Return what the glass currently shows as a PIL image.
+        
+        The image is oriented as the driver's frames are at its default
+        MADCTL, so a frame passed to display() comes back unchanged (apart
+        from RGB565 quantization).
+        """
+        self._flush_pixels()
+        visible = self.ram.crop((0, 0, LCD_WIDTH, LCD_HEIGHT))
+        # The reference MADCTL (MV|MX) maps host (x, y) to glass (239 - y, x)
+        return visible.transpose(Transpose.ROTATE_90)
+    
+    def stats(self):
+        """Return the traffic counters as a dict"""
+        return {
+            'bytes_sent': self.bytes_sent,
+            'transactions': self.transactions,
+            'commands': self.commands,
+            'pixels_written': self.pixels_written,
+        }
@@ -0,0 +1,11 @@
+"""
+MPD (Music Player Daemon) protocol client
+Keeps a persistent connection instead of running mpc for every command
+"""
+
+from .client import MPDClient, MPDError, MPDConnectionError, CommandError
+from .watcher import MPDWatcher
+from .broker import MPDBroker, get_broker
+
+__all__ = ['MPDClient', 'MPDError', 'MPDConnectionError', 'CommandError', 'MPDWatcher',
+           'MPDBroker', 'get_broker']
@@ -0,0 +1,353 @@
+"""
+Shared MPD connection broker
+
+One process-wide owner for MPD connections, so the player UI, an NFC tag
+handler and diagnostics don't each open their own and run into MPD's
+max_connections.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from .client import Commands, CommandList, MPDClient, MPDConnectionError
+from .watcher import MPDWatcher, DEFAULT_SUBSYSTEMS
+
+DEFAULT_WORKERS = 2
+DEFAULT_REQUEST_TIMEOUT = 10.0
+
+
+class MPDBroker:
+    """
+    Small pool of MPD connections shared by every caller in the process.
+    
+    Command connections are each owned by a worker thread; callers from
+    any thread submit work through a queue and get a Future back. One more
+    connection is reserved for idle and only opened once something
+    subscribes to change notifications. Connections are opened lazily.
+    While MPD is unreachable, requests fail straight away with
+    MPDConnectionError instead of waiting; reconnect attempts are spaced
+    with exponential backoff, and any idle notification resets it.
+    
+    Each request is sent at most once. A connection MPD has closed (say it
+    restarted) is noticed and replaced before sending, but a request whose
+    connection drops while it is in flight fails with MPDConnectionError
+    rather than being resent, since MPD may already have run it.
+    
+    Example:
+        broker = get_broker()
+        future = broker.submit(lambda mpd: mpd.status())
+        print(future.result()['state'])
+        
+        mpd = broker.client()      # MPDClient-like facade
+        mpd.next()
+    """
+    
+    def __init__(self, host=None, port=None, workers=DEFAULT_WORKERS,
+                 subsystems=DEFAULT_SUBSYSTEMS, retry_delay=0.5, max_retry_delay=30.0,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        """
+        Args:
+            host: MPD host or Unix socket path (see MPDClient)
+            port: MPD TCP port
+            workers: Number of command connections
+            subsystems: Subsystems the idle connection waits on
+            retry_delay: First delay in seconds before reconnecting
+            max_retry_delay: Upper bound for the doubling reconnect delay
+            request_timeout: Default seconds call() waits for a result
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.subsystems = subsystems
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.request_timeout = request_timeout
+        self.address = MPDClient(host, port).address
+        self.mpd_version = None
+        
+        # Reconnect backoff shared by the workers: no attempt before retry_at
+        self.available = True
+        self.retry_at = 0.0
+        self.delay = retry_delay
+        
+        self.requests = queue.Queue()
+        self.subscribers = []
+        self.watcher = None
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._clients = []
+        
+        # Counters
+        self.completed = 0
+        self.failed = 0
+        self.reconnects = 0
+    
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self.lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'mpd-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def stop(self, timeout=2.0):
+        """Stop the workers and the idle watcher and close their connections"""
+        with self.lock:
+            threads, self._threads = self._threads, []
+            watcher, self.watcher = self.watcher, None
+        self._stop.set()
+        for _ in threads:
+            self.requests.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        if watcher:
+            watcher.stop(timeout)
+        
+        # Fail whatever was still waiting for a connection
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request and request[0].set_running_or_notify_cancel():
+                request[0].set_exception(MPDConnectionError("MPD broker stopped"))
+    
+    def submit(self, func):
+        """
+        Queue func(client) to run on a command connection.
+        
+        Returns a concurrent.futures.Future for its result. Keep func
+        short and don't block in it: connections are shared.
+        """
+        if not self._threads:
+            self.start()
+        future = Future()
+        self.requests.put((future, func))
+        return future
+    
+    def call(self, func, timeout=None):
+        """
+        Run func(client) on a command connection and wait for its result.
+        
+        Raises MPDConnectionError if no connection was free within timeout
+        (default request_timeout); the request is then cancelled and never
+        sent. A request already sent is waited for, since its connection is
+        up and bounded by the socket timeout.
+        """
+        future = self.submit(func)
+        try:
+            return future.result(self.request_timeout if timeout is None else timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise MPDConnectionError(f"No answer from MPD at {self.address}") from None
+            return future.result()
+    
+    def client(self):
+        """Return an MPDClient-like object whose commands go through the broker"""
+        return BrokerClient(self)
+    
+    def subscribe(self, callback):
+        """
+        Call callback(subsystems) from the idle thread whenever MPD reports
+        changes. The reserved idle connection is opened on first subscribe.
+        """
+        with self.lock:
+            self.subscribers.append(callback)
+            if self.watcher is None:
+                self.watcher = MPDWatcher(self._notify, self.host, self.port, self.subsystems,
+                                          self.retry_delay, self.max_retry_delay)
+                self.watcher.start()
+    
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+    
+    def _notify(self, subsystems):
+        # The idle connection got an answer, so MPD is up again
+        self.retry_at = 0.0
+        for callback in list(self.subscribers):
+            callback(subsystems)
+    
+    def _connect(self, client):
+        """
+        Connect a worker's client if it isn't already (or MPD closed it).
+        
+        Makes at most one attempt, and none while backing off after a
+        failure; raises MPDConnectionError if MPD can't be reached.
+        """
+        client.check()
+        if client.connected:
+            return
+        if self._stop.is_set():
+            raise MPDConnectionError("MPD broker stopped")
+        now = time.monotonic()
+        if now < self.retry_at:
+            raise MPDConnectionError(f"MPD at {self.address} is unavailable")
+        try:
+            client.connect()
+        except MPDConnectionError as e:
+            with self.lock:
+                if self.available:
+                    print(f"MPD broker: {e}; reconnecting with backoff")
+                    self.available = False
+                    self.delay = self.retry_delay
+                else:
+                    self.delay = min(self.delay * 2, self.max_retry_delay)
+                self.retry_at = now + self.delay
+                self.reconnects += 1
+            raise
+        with self.lock:
+            if not self.available:
+                print(f"MPD broker: reconnected to {self.address}")
+            self.available = True
+            self.retry_at = 0.0
+        self.mpd_version = client.mpd_version
+    
+    def _run(self, client, future, func):
+        """Run one request, unless its caller has given up on it"""
+        try:
+            self._connect(client)
+        except MPDConnectionError as e:
+            if future.set_running_or_notify_cancel():
+                self.failed += 1
+                future.set_exception(e)
+            return
+        
+        # Only now is the request committed to; until here call() may cancel it
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(client)
+        except Exception as e:
+            self.failed += 1
+            future.set_exception(e)
+        else:
+            self.completed += 1
+            future.set_result(result)
+    
+    def _worker(self):
+        client = MPDClient(self.host, self.port)
+        with self.lock:
+            self._clients.append(client)
+        try:
+            while True:
+                request = self.requests.get()
+                if request is None:
+                    break
+                future, func = request
+                if not future.cancelled():
+                    self._run(client, future, func)
+        finally:
+            client.close()
+            with self.lock:
+                self._clients.remove(client)
+    
+    def stats(self):
+        """Return request counters and the number of open connections as a dict"""
+        watcher = self.watcher
+        with self.lock:
+            clients = list(self._clients)
+        connections = 0
+        for client in clients:
+            # Skip the check for a client busy with a request: it is connected
+            if client.lock.acquire(blocking=False):
+                try:
+                    client.check()
+                finally:
+                    client.lock.release()
+            connections += client.connected
+        if watcher and watcher.client.connected:
+            connections += 1
+        return {
+            'queued': self.requests.qsize(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'reconnects': self.reconnects + (watcher.reconnects if watcher else 0),
+            'connections': connections,
+        }
+
+
+class BrokerClient(Commands):
+    """
+    MPDClient stand-in that runs every command through an MPDBroker.
+    
+    Each command is one request on whichever command connection is free.
+    command_list() batches are recorded locally and sent as one request,
+    so they still take a single round trip on a single connection.
+    """
+    
+    def __init__(self, broker):
+        self.broker = broker
+    
+    @property
+    def address(self):
+        return self.broker.address
+    
+    @property
+    def mpd_version(self):
+        return self.broker.mpd_version
+    
+    def connect(self):
+        """Make sure MPD is reachable (raises MPDConnectionError if not)"""
+        self.broker.call(lambda client: client.connect())
+    
+    def close(self):
+        """Connections belong to the broker; nothing to do"""
+    
+    def execute(self, command, *args):
+        return self.broker.call(lambda client: client.execute(command, *args))
+    
+    def _command(self, parse, command, *args):
+        return self.broker.call(lambda client: client._command(parse, command, *args))
+    
+    def command_list(self):
+        return BrokerCommandList(self.broker)
+    
+    def toggle(self):
+        return self.broker.call(lambda client: client.toggle())
+    
+    def change_volume(self, delta):
+        return self.broker.call(lambda client: client.change_volume(delta))
+
+
+class BrokerCommandList(CommandList):
+    """CommandList that is sent on a broker connection"""
+    
+    def __init__(self, broker):
+        super().__init__(None)
+        self.broker = broker
+    
+    def execute(self):
+        if self.results is None:
+            def run(client):
+                self.client = client
+                try:
+                    return CommandList.execute(self)
+                finally:
+                    self.client = None
+            self.results = self.broker.call(run)
+        return self.results
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_broker(host=None, port=None):
+    """
+    Return the process-wide broker, creating and starting it on first use.
+    
+    host and port only matter for the first call.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MPDBroker(host, port)
+            _shared.start()
+        return _shared
@@ -0,0 +1,503 @@
+"""
+MPD protocol client
+
+Talks to MPD directly over one persistent TCP or Unix socket instead of
+forking an mpc process per command. Responses are parsed into dicts of
+strings, like mpc's --format fields.
+"""
+
+import os
+import socket
+import select
+import threading
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 6600
+DEFAULT_TIMEOUT = 5.0
+
+# Keys that start a new entry in a list response
+SONG_DELIMITERS = ('file',)
+ENTRY_DELIMITERS = ('file', 'directory', 'playlist')
+POSID_DELIMITERS = ('cpos',)
+
+
+class MPDError(Exception):
+    """Base class for MPD client errors"""
+
+
+class MPDConnectionError(MPDError, ConnectionError):
+    """The connection to MPD could not be made or was lost"""
+
+
+class CommandError(MPDError):
+    """MPD rejected a command (an ACK response)"""
+    
+    def __init__(self, line):
+        # ACK [error@command_listNum] {current_command} message_text
+        self.line = line
+        self.code = None
+        self.command = None
+        self.message = line
+        try:
+            head, rest = line[len('ACK ['):].split(']', 1)
+            self.code = int(head.split('@')[0])
+            command, self.message = rest.strip()[1:].split('}', 1)
+            self.command = command
+            self.message = self.message.strip()
+        except ValueError:
+            pass
+        super().__init__(self.message)
+
+
+def quote(arg):
+    """Quote a command argument for the MPD protocol"""
+    text = str(arg)
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def parse_pairs(lines):
+    """Split 'key: value' response lines into (key, value) tuples"""
+    pairs = []
+    for line in lines:
+        key, _, value = line.partition(': ')
+        pairs.append((key, value))
+    return pairs
+
+
+def parse_object(lines):
+    """Parse a single-entry response (status, currentsong, stats) into a dict"""
+    return dict(parse_pairs(lines))
+
+
+def parse_objects(lines, delimiters=SONG_DELIMITERS):
+    """Parse a list response (playlistinfo, lsinfo) into a list of dicts"""
+    objects = []
+    current = None
+    for key, value in parse_pairs(lines):
+        if current is None or key in delimiters:
+            current = {}
+            objects.append(current)
+        current[key] = value
+    return objects
+
+
+def parse_entries(lines):
+    """Parse a database listing mixing songs, directories and playlists"""
+    return parse_objects(lines, ENTRY_DELIMITERS)
+
+
+def parse_posids(lines):
+    """Parse plchangesposid output into a list of (position, song id)"""
+    return [(int(entry['cpos']), int(entry['Id']))
+            for entry in parse_objects(lines, POSID_DELIMITERS)]
+
+
+def parse_song_id(lines):
+    return int(parse_object(lines)['Id'])
+
+
+def parse_update_id(lines):
+    return int(parse_object(lines).get('updating_db', 0))
+
+
+def format_command(command, args):
+    """Build a protocol command line with quoted arguments"""
+    return ' '.join([command] + [quote(arg) for arg in args])
+
+
+class Commands:
+    """
+    MPD protocol commands, shared by MPDClient and CommandList.
+    
+    Each method hands a response parser and the command to _command(),
+    which either runs it straight away (MPDClient) or queues it for a
+    batch (CommandList).
+    """
+    
+    def _command(self, parse, command, *args):
+        raise NotImplementedError
+    
+    # Queries
+    
+    def ping(self):
+        return self._command(None, 'ping')
+    
+    def status(self):
+        """Player status: state, volume, song, elapsed, duration, playlist, ..."""
+        return self._command(parse_object, 'status')
+    
+    def stats(self):
+        """Database statistics: artists, albums, songs, uptime, db_update, ..."""
+        return self._command(parse_object, 'stats')
+    
+    def currentsong(self):
+        """Tags of the current song, or {} if there is none"""
+        return self._command(parse_object, 'currentsong')
+    
+    def playlistinfo(self, position=None):
+        """Songs in the queue (or the one at position)"""
+        args = () if position is None else (position,)
+        return self._command(parse_objects, 'playlistinfo', *args)
+    
+    def plchanges(self, version):
+        """Songs at queue positions that changed since queue version"""
+        return self._command(parse_objects, 'plchanges', version)
+    
+    def plchangesposid(self, version):
+        """(position, song id) of queue positions changed since version"""
+        return self._command(parse_posids, 'plchangesposid', version)
+    
+    def lsinfo(self, uri=''):
+        """Directories, songs and playlists in a database directory"""
+        return self._command(parse_entries, 'lsinfo', uri)
+    
+    def listallinfo(self, uri=''):
+        """Every song and directory under uri (can be large)"""
+        return self._command(parse_entries, 'listallinfo', uri)
+    
+    # Playback
+    
+    def play(self, position=None):
+        """Start playing, at a queue position (0-based) if given"""
+        args = () if position is None else (position,)
+        return self._command(None, 'play', *args)
+    
+    def pause(self, paused=True):
+        return self._command(None, 'pause', 1 if paused else 0)
+    
+    def stop(self):
+        return self._command(None, 'stop')
+    
+    def next(self):
+        return self._command(None, 'next')
+    
+    def previous(self):
+        return self._command(None, 'previous')
+    
+    def seekcur(self, seconds):
+        """Seek within the current song; a string like '+5' seeks relatively"""
+        return self._command(None, 'seekcur', seconds)
+    
+    def setvol(self, volume):
+        return self._command(None, 'setvol', max(0, min(100, int(volume))))
+    
+    # Queue and database
+    
+    def clear(self):
+        return self._command(None, 'clear')
+    
+    def add(self, uri):
+        """Add a song or directory ('/' or '' for everything) to the queue"""
+        return self._command(None, 'add', '' if uri == '/' else uri)
+    
+    def addid(self, uri, position=None):
+        """Add one song to the queue and return its song id"""
+        args = (uri,) if position is None else (uri, position)
+        return self._command(parse_song_id, 'addid', *args)
+    
+    def delete(self, position):
+        return self._command(None, 'delete', position)
+    
+    def move(self, position, to):
+        """Move the song at position to queue position to"""
+        return self._command(None, 'move', position, to)
+    
+    def update(self, uri=None):
+        """Start a database rescan; return the update job id"""
+        args = () if uri is None else (uri,)
+        return self._command(parse_update_id, 'update', *args)
+
+
+class MPDClient(Commands):
+    """
+    Persistent MPD connection.
+    
+    The host is a hostname, or an absolute path for a Unix socket; by
+    default MPD_HOST/MPD_PORT are honored like mpc does. Commands are
+    serialized with a lock, so one client can be shared between threads,
+    but a blocking idle() holds the connection until MPD answers.
+    
+    Example:
+        with MPDClient() as mpd:
+            mpd.toggle()
+            print(mpd.status()['state'])
+    """
+    
+    def __init__(self, host=None, port=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            host: Hostname or Unix socket path (default: $MPD_HOST or localhost)
+            port: TCP port (default: $MPD_PORT or 6600)
+            timeout: Socket timeout in seconds for connecting and replies
+        """
+        self.host = host or os.environ.get('MPD_HOST', DEFAULT_HOST)
+        self.port = int(port or os.environ.get('MPD_PORT', DEFAULT_PORT))
+        self.timeout = timeout
+        self.mpd_version = None
+        self.sock = None
+        self.file = None
+        self.idling = False
+        self.lock = threading.RLock()
+    
+    def __enter__(self):
+        self.connect()
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    @property
+    def connected(self):
+        return self.sock is not None
+    
+    def connect(self):
+        """Open the connection and read MPD's greeting (no-op if already connected)"""
+        with self.lock:
+            if self.sock is not None:
+                return
+            try:
+                if self.host.startswith('/'):
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.settimeout(self.timeout)
+                    sock.connect(self.host)
+                else:
+                    sock = socket.create_connection((self.host, self.port), self.timeout)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError as e:
+                raise MPDConnectionError(f"Cannot connect to MPD at {self.address}: {e}") from e
+            
+            self.sock = sock
+            self.file = sock.makefile('rb')
+            greeting = self._read_line()
+            if not greeting.startswith('OK MPD '):
+                self.close()
+                raise MPDConnectionError(f"Unexpected greeting from {self.address}: {greeting!r}")
+            self.mpd_version = greeting[len('OK MPD '):]
+    
+    @property
+    def address(self):
+        return self.host if self.host.startswith('/') else f"{self.host}:{self.port}"
+    
+    def close(self):
+        """Close the connection, politely if it is still up"""
+        with self.lock:
+            if self.sock is None:
+                return
+            try:
+                self.sock.sendall(b'close\n')
+            except OSError:
+                pass
+            self._drop()
+    
+    def check(self):
+        """
+        Drop the connection if MPD has closed it.
+        
+        MPD only sends in reply to a command, so a connection with nothing
+        outstanding that turns readable has hit EOF or an error (for
+        example MPD restarted). The next command then reconnects first.
+        """
+        with self.lock:
+            if self.sock is None or self.idling:
+                return
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if readable:
+                self._drop()
+    
+    def _drop(self):
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+        self.sock = None
+        self.file = None
+    
+    def _write(self, line):
+        try:
+            self.sock.sendall(line.encode('utf-8') + b'\n')
+        except OSError as e:
+            self._drop()
+            raise MPDConnectionError(f"Connection to MPD lost: {e}") from e
+    
+    def _read_line(self):
+        try:
+            line = self.file.readline()
+        except OSError as e:
+            self._drop()
+            raise MPDConnectionError(f"Connection to MPD lost: {e}") from e
+        if not line:
+            self._drop()
+            raise MPDConnectionError("Connection closed by MPD")
+        return line.decode('utf-8').rstrip('\n')
+    
+    def _read_response(self):
+        """Read lines up to OK; raise CommandError on ACK"""
+        lines = []
+        while True:
+            line = self._read_line()
+            if line == 'OK':
+                return lines
+            if line.startswith('ACK '):
+                raise CommandError(line)
+            lines.append(line)
+    
+    def execute(self, command, *args):
+        """
+        Send one command and return its raw response lines.
+        
+        Connects on first use. Raises CommandError if MPD rejects the
+        command and MPDConnectionError if the connection fails; the next
+        call will then reconnect.
+        """
+        line = format_command(command, args)
+        with self.lock:
+            self.connect()
+            self._write(line)
+            return self._read_response()
+    
+    def idle(self, *subsystems):
+        """
+        Wait until something changes in MPD and return the changed subsystems.
+        
+        Blocks with no timeout until MPD reports a change in one of the
+        given subsystems (all of them if none are given) or noidle() is
+        called from another thread, in which case the result may be empty.
+        The connection can't be used for anything else meanwhile, so idle
+        on a client of its own.
+        """
+        with self.lock:
+            self.connect()
+            self._write(' '.join(('idle',) + subsystems))
+            self.sock.settimeout(None)
+            self.idling = True
+            try:
+                lines = self._read_response()
+            finally:
+                self.idling = False
+                if self.sock is not None:
+                    self.sock.settimeout(self.timeout)
+        return [value for key, value in parse_pairs(lines) if key == 'changed']
+    
+    def noidle(self):
+        """Make a blocking idle() in another thread return early"""
+        sock = self.sock
+        if sock is not None and self.idling:
+            try:
+                sock.sendall(b'noidle\n')
+            except OSError:
+                pass
+    
+    def abort(self):
+        """Shut the socket down from another thread, failing any call in progress"""
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def _command(self, parse, command, *args):
+        lines = self.execute(command, *args)
+        return parse(lines) if parse else None
+    
+    def command_list(self):
+        """
+        Start a batch of commands sent in one round trip.
+        
+        Example:
+            with mpd.command_list() as batch:
+                batch.clear()
+                batch.add('/')
+                batch.playlistinfo()
+            cleared, added, queue = batch.results
+        """
+        return CommandList(self)
+    
+    def toggle(self):
+        """Pause if playing, otherwise play (like mpc toggle); return the new state"""
+        if self.status().get('state') == 'play':
+            self.pause(True)
+            return 'pause'
+        self.play()
+        return 'play'
+    
+    def change_volume(self, delta):
+        """Adjust the volume by delta percent (like mpc volume +5); return the new volume"""
+        volume = int(self.status().get('volume', -1))
+        if volume < 0:
+            raise MPDError("MPD has no volume control for this output")
+        volume = max(0, min(100, volume + delta))
+        self.setvol(volume)
+        return volume
+
+
+class CommandList(Commands):
+    """
+    Commands queued on the client side and sent together.
+    
+    The whole list goes out wrapped in command_list_ok_begin /
+    command_list_end, so MPD runs it and answers in one round trip, with
+    a list_OK after each command's output. Call execute() (or leave the
+    with block) to send it; results holds each command's parsed result in
+    order. If MPD rejects a command it stops there: the CommandError has
+    the index of the failed command and the results of those before it.
+    """
+    
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+        self.results = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+    
+    def __len__(self):
+        return len(self.commands)
+    
+    def _command(self, parse, command, *args):
+        if self.results is not None:
+            raise MPDError("Command list has already been sent")
+        self.commands.append((parse, format_command(command, args)))
+    
+    def execute(self):
+        """Send the queued commands and return the list of their results"""
+        if self.results is not None:
+            return self.results
+        results = []
+        if not self.commands:
+            self.results = results
+            return results
+        
+        lines = ['command_list_ok_begin']
+        lines.extend(line for _, line in self.commands)
+        lines.append('command_list_end')
+        client = self.client
+        with client.lock:
+            client.connect()
+            client._write('\n'.join(lines))
+            parsers = iter(self.commands)
+            response = []
+            try:
+                while True:
+                    line = client._read_line()
+                    if line == 'list_OK':
+                        parse, _ = next(parsers)
+                        results.append(parse(response) if parse else None)
+                        response = []
+                    elif line == 'OK':
+                        break
+                    elif line.startswith('ACK '):
+                        raise CommandError(line)
+                    else:
+                        response.append(line)
+            except CommandError as e:
+                e.index = len(results)
+                e.results = results
+                raise
+        self.results = results
+        return results
@@ -0,0 +1,110 @@
+"""
+Background MPD change watcher
+"""
+
+import threading
+from .client import MPDClient, MPDError, MPDConnectionError
+
+# Subsystems the music player cares about
+DEFAULT_SUBSYSTEMS = ('player', 'mixer', 'playlist', 'options')
+
+
+class MPDWatcher:
+    """
+    Thread that sits in MPD's idle command and reports changes.
+    
+    It uses a connection of its own, so there is no traffic at all while
+    nothing changes. The callback is called from the watcher thread with
+    the list of changed subsystems; hand the work over to your own thread
+    (e.g. through a queue) rather than drawing from it. Every subsystem is
+    reported as changed once connected, so listeners catch up on anything
+    that happened before the first idle. If the connection drops or MPD
+    refuses idle (e.g. it needs a password), the error is logged and kept
+    in .error, and the watcher reconnects with exponential backoff and
+    reports every subsystem again.
+    
+    Example:
+        watcher = MPDWatcher(events.put)
+        watcher.start()
+        ...
+        watcher.stop()
+    """
+    
+    def __init__(self, callback, host=None, port=None, subsystems=DEFAULT_SUBSYSTEMS,
+                 retry_delay=1.0, max_retry_delay=30.0):
+        """
+        Args:
+            callback: Called with a list of changed subsystem names
+            host: MPD host or Unix socket path (see MPDClient)
+            port: MPD TCP port
+            subsystems: Subsystems to wait on
+            retry_delay: First delay in seconds before reconnecting
+            max_retry_delay: Upper bound for the doubling reconnect delay
+        """
+        self.callback = callback
+        self.client = MPDClient(host, port)
+        self.subsystems = tuple(subsystems)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.events = 0
+        self.reconnects = 0
+        self.error = None  # Last error, until idle works again
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start watching in a daemon thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mpd-watcher', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=2.0):
+        """Leave idle, stop the thread and close the connection"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self.client.noidle()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # noidle raced with the thread re-entering idle
+            self.client.abort()
+            self._thread.join(timeout)
+        self._thread = None
+        self.client.close()
+    
+    def _run(self):
+        delay = self.retry_delay
+        resync = True
+        while not self._stop.is_set():
+            try:
+                if resync:
+                    self.client.connect()
+                    resync = False
+                    delay = self.retry_delay
+                    if isinstance(self.error, MPDConnectionError):
+                        print(f"MPD watcher: reconnected to {self.client.address}")
+                        self.error = None
+                    self.callback(list(self.subsystems))
+                changed = self.client.idle(*self.subsystems)
+                self.error = None
+            except MPDError as e:
+                if self._stop.is_set():
+                    break
+                # Only the first failed attempt is logged, not every retry
+                if self.error is None:
+                    print(f"MPD watcher: {e}; reconnecting with backoff")
+                self.error = e
+                if not isinstance(e, MPDConnectionError):
+                    # MPD answered idle with an ACK; start over on a new connection
+                    self.client.close()
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                self.reconnects += 1
+                resync = True
+                continue
+            
+            if changed and not self._stop.is_set():
+                self.events += 1
+                self.callback(changed)
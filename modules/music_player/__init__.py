@@ -4,7 +4,13 @@ Full-featured music player with album art and playback controls
 """
 
 from .player import MusicPlayer
+from .scheduler import FrameScheduler
+from .state import PlayerState
+from .library import Library, LibraryBrowser
+from .tracks import TrackStore, QueueMirror
 from .ui import run_player
+from .benchmark import run_benchmarks
 
-__all__ = ['MusicPlayer', 'run_player']
+__all__ = ['MusicPlayer', 'FrameScheduler', 'PlayerState', 'Library', 'LibraryBrowser',
+           'TrackStore', 'QueueMirror', 'run_player', 'run_benchmarks']
 
@@ -0,0 +1,267 @@
+"""
+Headless benchmark suite for the music player frame path
+
+Times UI rendering, RGB565 encoding, full and partial refreshes and cover
+loading against a VirtualPanel, so it runs on any Linux box without the
+HAT. Each case reports frames/sec, p50/p99 latency and peak Python
+allocations (tracemalloc), and the whole run can be written as JSON and
+compared against an earlier one.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+import PIL
+from modules.lcd import LCD_1in3, LCD_WIDTH, LCD_HEIGHT, VirtualPanel
+from modules.lcd.encoder import image_to_rgb565
+from .player import MusicPlayer
+from .cover_cache import CoverCache
+from .library import Library, LibraryBrowser
+from .tracks import TrackStore
+
+# Iterations per case in the (slower) tracemalloc pass
+ALLOC_ITERATIONS = 10
+
+# Frame period used to drive progress and title scrolling, in seconds
+TICK = 0.1
+
+# Tracks in the synthetic library/queue used by the library_scroll and
+# queue_move cases
+LIBRARY_TRACKS = 20000
+
+
+def percentile(samples, p):
+    """Return the p-th percentile (0-100) of a sorted list of samples"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+
+def measure(step, iterations):
+    """
+    Time step() over iterations calls, then measure its peak allocations.
+    
+    Returns a dict of frames/sec, mean/p50/p99/max latency in ms and the
+    peak traced allocation in KB.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        step()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    
+    # Tracing slows everything down, so allocations get their own short pass
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, ALLOC_ITERATIONS)):
+            tracemalloc.reset_peak()
+            step()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    total = sum(samples)
+    return {
+        'frames': iterations,
+        'fps': round(iterations / total, 1) if total else 0.0,
+        'mean_ms': round(total * 1000 / iterations, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+class PlaybackSimulation:
+    """Drives a MusicPlayer through simulated playback on a synthetic clock"""
+    
+    def __init__(self, player):
+        self.player = player
+        self.player.is_playing = True
+        self.now = 0.0
+    
+    def tick(self):
+        """Advance one frame period and return the rendered (image, regions)"""
+        self.now += TICK
+        self.player.progress += TICK / self.player.playlist[self.player.current_track]["duration"]
+        if self.player.progress >= 1.0:
+            self.player.progress = 0.0
+            self.player.next_track()
+        self.player.mark_dirty()
+        self.player.animate(self.now)
+        return self.player.render_frame()
+    
+    def change_track(self):
+        """Skip to the next track and render the resulting frame"""
+        self.player.next_track()
+        return self.player.render_frame()
+
+
+def synthetic_queue(count):
+    """Build a TrackStore of count tracks, 12 per album and 10 albums per artist"""
+    return TrackStore(
+        {"file": f"Artist {i // 120:05d}/Album {i // 12}/{i % 12 + 1:02d}.flac",
+         "Title": f"Track {i % 12 + 1}", "Artist": f"Artist {i // 120:05d}",
+         "Album": f"Album {i // 12}", "duration": "240.0", "Id": str(i)}
+        for i in range(count)
+    )
+
+
+def synthetic_library(count):
+    """Build a Library over a synthetic queue of count tracks"""
+    return Library(synthetic_queue(count))
+
+
+def git_revision():
+    """Short hash of the checked-out commit, or None outside a git tree"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def run_suite(frames=200):
+    """
+    Run every benchmark case and return the results as a dict.
+    
+    Args:
+        frames: Iterations per case
+    """
+    panel = VirtualPanel()
+    lcd = LCD_1in3(transport=panel)
+    lcd.init()
+    
+    player = MusicPlayer(LCD_WIDTH, LCD_HEIGHT)
+    sim = PlaybackSimulation(player)
+    image, _ = player.render_frame()
+    
+    def display_full():
+        lcd.invalidate()
+        lcd.display(image)
+    
+    def display_partial():
+        frame, regions = sim.tick()
+        lcd.display(frame, regions)
+    
+    browser = LibraryBrowser(synthetic_library(LIBRARY_TRACKS), player.text, LCD_WIDTH, LCD_HEIGHT)
+    
+    def library_scroll():
+        # Walk down the artist list one row at a time, wrapping at the end
+        if browser.level.selected == len(browser.level.items) - 1:
+            browser.move(-browser.level.selected)
+        browser.move(1)
+        frame, regions = browser.render_frame()
+        lcd.display(frame, regions)
+    
+    tracks = synthetic_queue(LIBRARY_TRACKS)
+    
+    def queue_move():
+        # What QueueMirror applies when MPD moves the first track down an
+        # album: the rows of the 13 positions in between, looked up by id
+        known = tracks.positions()
+        ids = list(tracks.ids[:13])
+        ids.append(ids.pop(0))
+        tracks.apply(len(tracks), [(position, tracks.row(known[song_id]))
+                                   for position, song_id in enumerate(ids)])
+    
+    covers = [track["cover"] for track in player.playlist if os.path.exists(track["cover"])]
+    cover_cache = CoverCache()
+    cover_index = [0]
+    
+    def next_cover():
+        cover_index[0] = (cover_index[0] + 1) % len(covers)
+        return covers[cover_index[0]]
+    
+    cases = [
+        ('render_playback', lambda: sim.tick()),
+        ('render_track_change', lambda: sim.change_track()),
+        ('encode_full_frame', lambda: image_to_rgb565(image)),
+        ('display_full', display_full),
+        ('display_partial', display_partial),
+        ('library_scroll', library_scroll),
+        ('queue_move', queue_move),
+    ]
+    if covers:
+        cases.append(('cover_load', lambda: cover_cache.load(next_cover())))
+        cases.append(('cover_cached', lambda: cover_cache.get(next_cover())))
+    
+    # measure() calls each step in both the timing and allocation passes
+    calls = frames + min(frames, ALLOC_ITERATIONS)
+    results = {}
+    for name, step in cases:
+        panel.reset_counters()
+        results[name] = measure(step, frames)
+        results[name]['spi_bytes_per_frame'] = panel.bytes_sent // calls
+    
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'machine': platform.machine(),
+        'frames': frames,
+        'cases': results,
+    }
+
+
+def format_results(results, baseline=None):
+    """
+    Format results as a table, with FPS change against a baseline run if given.
+    """
+    lines = [f"Revision {results['revision'] or 'unknown'}, Python {results['python']}, "
+             f"Pillow {results['pillow']}, {results['machine']}"]
+    header = f"  {'case':<20} {'fps':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak KB':>9} {'SPI B/fr':>9}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    lines.append(header)
+    
+    for name, case in results['cases'].items():
+        line = (f"  {name:<20} {case['fps']:>9.1f} {case['p50_ms']:>9.3f} "
+                f"{case['p99_ms']:>9.3f} {case['peak_kb']:>9.1f} {case['spi_bytes_per_frame']:>9}")
+        if baseline:
+            old = baseline['cases'].get(name)
+            if old and old['fps']:
+                line += f" {(case['fps'] / old['fps'] - 1) * 100:>+7.1f}%"
+            else:
+                line += f" {'new':>8}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def run_benchmarks(frames=200, output=None, baseline=None):
+    """
+    Run the suite, print a summary and optionally save/compare JSON results.
+    
+    Args:
+        frames: Iterations per case
+        output: Path to write the results to as JSON
+        baseline: Path of an earlier JSON results file to compare against
+    """
+    previous = None
+    if baseline:
+        with open(baseline) as f:
+            previous = json.load(f)
+    
+    print(f"Benchmarking the music player frame path ({frames} frames per case)...")
+    results = run_suite(frames)
+    print(format_results(results, previous))
+    
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+    return results
+
+
+if __name__ == '__main__':
+    try:
+        run_benchmarks(output=sys.argv[1] if len(sys.argv) > 1 else None)
+    except KeyboardInterrupt:
+        print("\nBenchmark interrupted by user")
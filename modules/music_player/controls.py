@@ -26,22 +26,26 @@ class InputHandler:
         # Button state tracking
         self.last_states = {
             'key1': True,
+            'key2': True,
             'key3': True,
             'joy_left': True,
             'joy_right': True,
             'joy_up': True,
             'joy_down': True,
+            'joy_press': True,
         }
     
     def read_buttons(self):
         """Read all button states and detect presses (active low)"""
         current = {
             'key1': self.GPIO.input(KEY1),
+            'key2': self.GPIO.input(KEY2),
             'key3': self.GPIO.input(KEY3),
             'joy_left': self.GPIO.input(JOY_LEFT),
             'joy_right': self.GPIO.input(JOY_RIGHT),
             'joy_up': self.GPIO.input(JOY_UP),
             'joy_down': self.GPIO.input(JOY_DOWN),
+            'joy_press': self.GPIO.input(JOY_PRESS),
         }
         
         # Detect button presses (transition from high to low)
@@ -0,0 +1,153 @@
+"""
+Album art cache for the music player
+"""
+
+import os
+import zlib
+import colorsys
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageOps
+
+# Pillow < 9.1 has the resampling filters on Image itself
+Resampling = getattr(Image, 'Resampling', Image)
+
+
+class CoverCache:
+    """
+    Bounded LRU cache of album covers, pre-scaled to the art box.
+    
+    Covers are decoded lazily on first use. JPEGs are decoded in draft mode
+    at the smallest scale that still covers the box, then cropped and
+    resized to exactly fit it. Entries are keyed by path and modification
+    time, so an edited file is reloaded. When the cached images exceed
+    max_bytes, the least recently used covers are dropped. Covers reach the
+    panel through the compositor's art layer, so only PIL images are kept.
+    """
+    
+    def __init__(self, size=(100, 100), max_bytes=4 * 1024 * 1024):
+        """
+        Args:
+            size: (width, height) covers are scaled to
+            max_bytes: Memory budget for decoded covers
+        """
+        self.size = size
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # (path, mtime) -> (image, nbytes)
+        self.keys = {}                # path -> current (path, mtime)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def _lookup(self, path):
+        """Return the cache entry for path, loading it if needed (None if missing)"""
+        if not path:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        
+        key = (path, mtime)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        
+        self.misses += 1
+        try:
+            image = self.load(path)
+        except OSError:
+            return None
+        
+        nbytes = image.width * image.height * 3
+        entry = (image, nbytes)
+        
+        # Drop any older version of the same file
+        stale = self.keys.get(path)
+        if stale is not None:
+            self._remove(stale)
+        
+        self.entries[key] = entry
+        self.keys[path] = key
+        self.total_bytes += nbytes
+        self._evict()
+        return entry
+    
+    def load(self, path):
+        """Decode a cover and scale it to the art box"""
+        with Image.open(path) as image:
+            # JPEG only: let the decoder downscale by 1/2, 1/4 or 1/8
+            image.draft('RGB', self.size)
+            image = image.convert('RGB')
+        if image.size != self.size:
+            image = ImageOps.fit(image, self.size, Resampling.LANCZOS)
+        return image
+    
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+            if self.keys.get(key[0]) == key:
+                del self.keys[key[0]]
+    
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone is over budget
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            self._remove(key)
+            self.evictions += 1
+    
+    def get(self, path):
+        """Return the scaled cover for path as a PIL image, or None if unavailable"""
+        entry = self._lookup(path)
+        return entry[0] if entry else None
+    
+    def stats(self):
+        """Return cache statistics as a dict"""
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def placeholder_seed(artist, album=""):
+    """Stable seed for an album's placeholder art, so each album gets its own color"""
+    return zlib.crc32(f"{artist}\0{album}".encode('utf-8'))
+
+
+@lru_cache(maxsize=64)
+def placeholder_art(size, seed):
+    """
+    Generate placeholder album art: a vertical gradient with a music note.
+    
+    Results are memoized per (size, seed); treat the returned image as
+    read-only.
+    
+    Args:
+        size: Width and height in pixels
+        seed: Integer (see placeholder_seed) that picks the hue
+    """
+    hue = (seed % 360) / 360.0
+    r, g, b = colorsys.hsv_to_rgb(hue, 0.67, 0.71)
+    
+    # One column of gradient, darkening to ~72% at the bottom, stretched sideways
+    column = Image.new('RGB', (1, size))
+    column.putdata([
+        (int(r * shade), int(g * shade), int(b * shade))
+        for shade in (255 * (1 - 0.28 * i / size) for i in range(size))
+    ])
+    image = column.resize((size, size), Resampling.NEAREST)
+    
+    # Musical note icon
+    draw = ImageDraw.Draw(image)
+    c = size // 2
+    draw.ellipse([c - 15, c + 10, c + 5, c + 30], fill=(255, 255, 255))
+    draw.rectangle([c + 15, c - 20, c + 20, c + 20], fill=(255, 255, 255))
+    draw.ellipse([c + 5, c + 10, c + 25, c + 30], fill=(255, 255, 255))
+    return image
@@ -0,0 +1,85 @@
+"""
+Retained-mode layer compositor for the music player UI
+"""
+
+from PIL import Image
+
+
+class Layer:
+    """
+    A rectangular piece of the UI that is re-rendered only when its key changes.
+    
+    The render function is called as render(canvas, key), where canvas is a
+    copy of the background under the layer's box; it draws on the canvas in
+    local coordinates (the box's top-left corner is (0, 0)).
+    """
+    
+    def __init__(self, name, box, render):
+        """
+        Args:
+            name: Layer name, used to pass its key to Compositor.compose()
+            box: (x_start, y_start, x_end, y_end) on screen, ends exclusive
+            render: Function drawing the layer for a given key
+        """
+        self.name = name
+        self.box = box
+        self.render = render
+        self.key = None
+        self.image = None
+    
+    def update(self, background, key):
+        """Re-render if key differs from the last one; return True if it did"""
+        if self.image is not None and key == self.key:
+            return False
+        canvas = background.crop(self.box)
+        self.render(canvas, key)
+        self.image = canvas
+        self.key = key
+        return True
+
+
+class Compositor:
+    """
+    Builds frames from a static background plus a stack of small layers.
+    
+    The background is rendered once. On each compose() only the layers whose
+    keys changed are redrawn and pasted into the retained frame. Layers are
+    opaque and must not overlap.
+    """
+    
+    def __init__(self, size, render_background, color=(0, 0, 0)):
+        """
+        Args:
+            size: (width, height) of the frame
+            render_background: Function drawing the static parts onto an image
+            color: Fill color of the background before render_background runs
+        """
+        self.background = Image.new('RGB', size, color)
+        render_background(self.background)
+        self.frame = self.background.copy()
+        self.layers = []
+    
+    def add_layer(self, name, box, render):
+        """Add a layer on top of the existing ones and return it"""
+        layer = Layer(name, box, render)
+        self.layers.append(layer)
+        return layer
+    
+    def compose(self, keys):
+        """
+        Bring every layer up to date and return the frame.
+        
+        Args:
+            keys: Dict mapping layer name to the value its content depends on
+        
+        Returns:
+            (image, changed) where image is a copy of the frame that is safe
+            to hand to the display and changed lists the boxes that were
+            repainted.
+        """
+        changed = []
+        for layer in self.layers:
+            if layer.update(self.background, keys[layer.name]):
+                self.frame.paste(layer.image, layer.box[:2])
+                changed.append(layer.box)
+        return self.frame.copy(), changed
@@ -0,0 +1,280 @@
+"""
+Music library browser for the music player UI
+"""
+
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+from .player import BACKGROUND_COLOR, ARTIST_FONT, SMALL_FONT
+
+# List layout in pixels: a header line, then fixed-height rows
+HEADER_HEIGHT = 24
+ROW_HEIGHT = 24
+SCROLLBAR_WIDTH = 4
+MIN_THUMB_HEIGHT = 8
+
+ROW_COLOR = (220, 220, 220)
+SELECTED_BACKGROUND = (40, 70, 110)
+HEADER_COLOR = (150, 150, 150)
+SCROLLBAR_COLOR = (100, 100, 100)
+
+UNKNOWN_ALBUM = "Unknown Album"
+
+
+class Library:
+    """
+    Tracks grouped by artist and album for browsing.
+    
+    Built once from a list of track dicts ("title", "artist" and optionally
+    "album"). Artists and albums sort case-insensitively; tracks keep their
+    original order within an album. Only track indexes are stored in the
+    groups, so a library of tens of thousands of tracks stays small.
+    """
+    
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.groups = {}  # artist -> album -> [track index]
+        for index, track in enumerate(tracks):
+            albums = self.groups.setdefault(track["artist"], {})
+            albums.setdefault(track.get("album", ""), []).append(index)
+        self.artists = sorted(self.groups, key=str.casefold)
+    
+    def __len__(self):
+        return len(self.tracks)
+    
+    def albums(self, artist):
+        """Return an artist's album names, sorted"""
+        return sorted(self.groups[artist], key=str.casefold)
+    
+    def album_tracks(self, artist, album):
+        """Return the track dicts of an album in order"""
+        return [self.tracks[index] for index in self.groups[artist][album]]
+
+
+class BrowseLevel:
+    """One list in the artists -> albums -> tracks hierarchy"""
+    
+    __slots__ = ('title', 'items', 'labels', 'leaf', 'selected', 'top')
+    
+    def __init__(self, title, items, labels, leaf=False):
+        """
+        Args:
+            title: Header text
+            items: What each row stands for (artist, album or track dict)
+            labels: Row text, indexable like items
+            leaf: True for the track list, where entering plays a track
+        """
+        self.title = title
+        self.items = items
+        self.labels = labels
+        self.leaf = leaf
+        self.selected = 0
+        self.top = 0
+
+
+class LibraryBrowser:
+    """
+    Scrollable, virtualized list screen for browsing a Library.
+    
+    Only the rows in view are looked at. Each row is rendered once per
+    (label, selected, has-children) into a small LRU of row bitmaps, and
+    the retained frame is patched slot by slot: moving the selection
+    within the view repaints two rows, scrolling repaints the list area,
+    and the header and scrollbar only when they change. render_frame()
+    has the same contract as MusicPlayer.render_frame(), returning the
+    frame and the screen boxes that differ from the last one.
+    """
+    
+    def __init__(self, library, text, lcd_width=240, lcd_height=240, max_cached_rows=64):
+        """
+        Args:
+            library: Library to browse
+            text: TextRenderer shared with the player
+            lcd_width: Screen width in pixels
+            lcd_height: Screen height in pixels
+            max_cached_rows: Number of rendered row bitmaps to keep
+        """
+        self.library = library
+        self.text = text
+        self.lcd_width = lcd_width
+        self.lcd_height = lcd_height
+        self.visible_rows = (lcd_height - HEADER_HEIGHT) // ROW_HEIGHT
+        self.row_width = lcd_width - SCROLLBAR_WIDTH
+        self.max_cached_rows = max_cached_rows
+        self.row_cache = OrderedDict()
+        
+        self.frame = Image.new('RGB', (lcd_width, lcd_height), BACKGROUND_COLOR)
+        self.drawn = None
+        self.dirty = True
+        
+        self.levels = [BrowseLevel(f"Artists ({len(library.artists)})",
+                                   library.artists, library.artists)]
+    
+    @property
+    def level(self):
+        """The list currently shown"""
+        return self.levels[-1]
+    
+    def invalidate(self):
+        """Forget what is on screen, so the next frame is sent in full"""
+        self.drawn = None
+        self.dirty = True
+    
+    def move(self, delta):
+        """Move the selection by delta rows, scrolling to keep it in view"""
+        level = self.level
+        selected = max(0, min(len(level.items) - 1, level.selected + delta))
+        if selected == level.selected:
+            return
+        level.selected = selected
+        if selected < level.top:
+            level.top = selected
+        elif selected >= level.top + self.visible_rows:
+            level.top = selected - self.visible_rows + 1
+        self.dirty = True
+    
+    def enter(self):
+        """
+        Open the selected artist or album.
+        
+        Returns:
+            (tracks, index) when a track is selected, so the caller can
+            play the album from it; otherwise None.
+        """
+        level = self.level
+        if not level.items:
+            return None
+        item = level.items[level.selected]
+        if level.leaf:
+            return level.items, level.selected
+        
+        if len(self.levels) == 1:
+            albums = self.library.albums(item)
+            labels = [album or UNKNOWN_ALBUM for album in albums]
+            self.levels.append(BrowseLevel(item, albums, labels))
+        else:
+            artist = self.levels[-2].items[self.levels[-2].selected]
+            tracks = self.library.album_tracks(artist, item)
+            labels = [track["title"] for track in tracks]
+            self.levels.append(BrowseLevel(item or UNKNOWN_ALBUM, tracks, labels, leaf=True))
+        self.dirty = True
+        return None
+    
+    def back(self):
+        """Return to the parent list; return False if already at the top"""
+        if len(self.levels) == 1:
+            return False
+        self.levels.pop()
+        self.dirty = True
+        return True
+    
+    def slot_keys(self):
+        """Return what each on-screen row slot shows, or None for empty slots"""
+        level = self.level
+        keys = []
+        for slot in range(self.visible_rows):
+            index = level.top + slot
+            if index < len(level.items):
+                keys.append((level.labels[index], index == level.selected, not level.leaf))
+            else:
+                keys.append(None)
+        return keys
+    
+    def scrollbar_key(self):
+        """Return the scrollbar thumb as (y, height) in the list area, or None"""
+        level = self.level
+        count = len(level.items)
+        if count <= self.visible_rows:
+            return None
+        track = self.visible_rows * ROW_HEIGHT
+        height = max(MIN_THUMB_HEIGHT, track * self.visible_rows // count)
+        y = (track - height) * level.top // (count - self.visible_rows)
+        return (y, height)
+    
+    def render_row(self, key):
+        """Return the bitmap for a row slot, from the cache if possible"""
+        image = self.row_cache.get(key)
+        if image is not None:
+            self.row_cache.move_to_end(key)
+            return image
+        
+        label, selected, has_children = key
+        background = SELECTED_BACKGROUND if selected else BACKGROUND_COLOR
+        image = Image.new('RGB', (self.row_width, ROW_HEIGHT), background)
+        text_width = self.row_width - 16 - (12 if has_children else 0)
+        self.text.draw(image, (8, 4), label, ARTIST_FONT, ROW_COLOR, background, text_width)
+        if has_children:
+            # Chevron marking rows that open another list
+            x, y = self.row_width - 14, ROW_HEIGHT // 2
+            ImageDraw.Draw(image).line([(x, y - 4), (x + 4, y), (x, y + 4)], fill=HEADER_COLOR, width=2)
+        
+        self.row_cache[key] = image
+        if len(self.row_cache) > self.max_cached_rows:
+            self.row_cache.popitem(last=False)
+        return image
+    
+    def draw_header(self, title):
+        draw = ImageDraw.Draw(self.frame)
+        draw.rectangle([0, 0, self.lcd_width, HEADER_HEIGHT - 1], fill=BACKGROUND_COLOR)
+        self.text.draw(self.frame, (10, 5), title, SMALL_FONT, HEADER_COLOR, BACKGROUND_COLOR,
+                       self.lcd_width - 20)
+        draw.line([(0, HEADER_HEIGHT - 1), (self.lcd_width, HEADER_HEIGHT - 1)], fill=(60, 60, 70))
+    
+    def draw_slot(self, slot, key):
+        y = HEADER_HEIGHT + slot * ROW_HEIGHT
+        if key is None:
+            ImageDraw.Draw(self.frame).rectangle(
+                [0, y, self.row_width - 1, y + ROW_HEIGHT - 1], fill=BACKGROUND_COLOR)
+        else:
+            self.frame.paste(self.render_row(key), (0, y))
+    
+    def draw_scrollbar(self, thumb):
+        x = self.row_width
+        draw = ImageDraw.Draw(self.frame)
+        draw.rectangle([x, HEADER_HEIGHT, self.lcd_width - 1, self.lcd_height - 1], fill=BACKGROUND_COLOR)
+        if thumb is not None:
+            y, height = thumb
+            draw.rectangle([x, HEADER_HEIGHT + y, self.lcd_width - 1, HEADER_HEIGHT + y + height - 1],
+                           fill=SCROLLBAR_COLOR)
+    
+    def render_frame(self):
+        """
+        Bring the retained frame up to date.
+        
+        Returns:
+            (image, regions): a copy of the frame and the boxes that changed
+            since the previous call (the whole screen after invalidate()).
+            Adjacent changed rows are merged into one box.
+        """
+        self.dirty = False
+        title = self.level.title
+        slots = self.slot_keys()
+        thumb = self.scrollbar_key()
+        
+        full = self.drawn is None
+        old_title, old_slots, old_thumb = self.drawn or (None, [None] * len(slots), None)
+        regions = []
+        
+        if full or title != old_title:
+            self.draw_header(title)
+            regions.append((0, 0, self.lcd_width, HEADER_HEIGHT))
+        
+        run_start = None
+        for slot, key in enumerate(slots + [None]):
+            changed = slot < len(slots) and (full or key != old_slots[slot])
+            if changed:
+                self.draw_slot(slot, key)
+                if run_start is None:
+                    run_start = slot
+            elif run_start is not None:
+                regions.append((0, HEADER_HEIGHT + run_start * ROW_HEIGHT,
+                                self.row_width, HEADER_HEIGHT + slot * ROW_HEIGHT))
+                run_start = None
+        
+        if full or thumb != old_thumb:
+            self.draw_scrollbar(thumb)
+            regions.append((self.row_width, HEADER_HEIGHT, self.lcd_width, self.lcd_height))
+        
+        self.drawn = (title, slots, thumb)
+        if full:
+            regions = [(0, 0, self.lcd_width, self.lcd_height)]
+        return self.frame.copy(), regions
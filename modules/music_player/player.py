@@ -2,14 +2,73 @@
 Music player logic and state management
 """
 
-import os
-from PIL import Image, ImageDraw
+import time
+import queue
+from functools import lru_cache
+from PIL import ImageDraw
+from modules.lcd import SpriteAtlas
+from .layers import Compositor
+from .cover_cache import CoverCache, placeholder_art, placeholder_seed
+from .text import TextRenderer, Marquee
+from .state import PlayerState
+from .tracks import QueueMirror
+from modules.mpd import MPDError
+
+# UI background color
+BACKGROUND_COLOR = (20, 20, 30)
+
+# Progress bar width in pixels
+PROGRESS_WIDTH = 220
+
+# Font sizes in pixels
+TITLE_FONT = 15
+ARTIST_FONT = 13
+SMALL_FONT = 11
+
+
+@lru_cache(maxsize=16)
+def layer_keys(state):
+    """
+    Map a PlayerState to the value each UI layer's content depends on.
+    
+    A pure function of the snapshot, memoized on it; treat the returned
+    dict as read-only.
+    """
+    return {
+        'volume': f"Vol: {state.volume}%",
+        'art': (state.cover, placeholder_seed(state.artist, state.album)),
+        'title': (state.title, state.title_offset),
+        'artist': state.artist,
+        'progress': state.progress_px,
+        'time': f"{format_time(state.elapsed)} / {format_time(state.duration)}",
+        'play_pause': state.is_playing,
+    }
+
+
+# Shown when the MPD queue is empty
+EMPTY_TRACK = {"title": "Queue is empty", "artist": "", "duration": 1, "cover": None}
+
+
+def format_time(seconds):
+    """Convert seconds to MM:SS format"""
+    mins = seconds // 60
+    secs = seconds % 60
+    return f"{mins}:{secs:02d}"
 
 
 class MusicPlayer:
     """Music player with playlist management and playback state"""
     
-    def __init__(self, lcd_width=240, lcd_height=240):
+    def __init__(self, lcd_width=240, lcd_height=240, mpd=None):
+        """
+        Args:
+            lcd_width: Screen width in pixels
+            lcd_height: Screen height in pixels
+            mpd: Optional MPDClient. If given, the playlist mirrors MPD's
+                 queue (a TrackStore kept in sync by a QueueMirror) and the
+                 controls drive MPD; otherwise a built-in sample playlist
+                 is played back in simulation.
+        """
         self.lcd_width = lcd_width
         self.lcd_height = lcd_height
         self.is_playing = False
@@ -17,6 +76,14 @@ class MusicPlayer:
         self.volume = 75
         self.progress = 0
         
+        # Set whenever something visible changes; cleared by draw_ui()
+        self.dirty = True
+        self.last_animate = None
+        
+        # Snapshot and frame last drawn, for changed_regions() and memoization
+        self.last_state = None
+        self.last_frame = None
+        
         # Sample playlist with cover art
         self.playlist = [
             {"title": "Midnight Dreams", "artist": "Luna Eclipse", "duration": 245, "cover": "album_cover_vinyl.png"},
@@ -25,45 +92,54 @@ class MusicPlayer:
             {"title": "Digital Love", "artist": "Synthwave 84", "duration": 267, "cover": "album_cover_abstract.png"},
         ]
         
-        # Load album covers
-        self.covers = {}
-        for track in self.playlist:
-            if os.path.exists(track["cover"]):
-                self.covers[track["cover"]] = Image.open(track["cover"]).convert('RGB')
-            else:
-                self.covers[track["cover"]] = None
+        # MPD state: the mirrored queue and the position at the last status,
+        # plus change notifications from an MPDWatcher (see on_mpd_change)
+        self.mpd = mpd
+        self.mpd_queue = QueueMirror()
+        self.duration = 0.0
+        self.elapsed = 0.0
+        self.elapsed_at = 0.0
+        self.mpd_events = queue.Queue()
+        self.last_progress_update = None
+        if mpd is not None:
+            self.sync_from_mpd()
+        
+        # Album covers are decoded on demand and kept scaled to the art box
+        self.cover_cache = CoverCache(size=(100, 100))
+        
+        # TrueType text with cached string bitmaps
+        self.text = TextRenderer()
+        
+        # Static background and per-element layers, built once for the layout
+        self.compositor = self.build_compositor()
     
-    def draw_album_art(self, image, x, y, size, cover_file):
-        """Draw album art - either from file or placeholder"""
-        cover = self.covers.get(cover_file)
+    def draw_album_art(self, image, x, y, size, cover_file, seed=0):
+        """
+        Draw album art - either from file or placeholder.
+        
+        seed picks the placeholder's color (see placeholder_seed).
+        """
+        cover = self.cover_cache.get(cover_file)
         
         if cover:
             # Paste the actual album cover
             image.paste(cover, (x, y))
         else:
-            # Draw placeholder if cover not found
-            draw = ImageDraw.Draw(image)
-            # Gradient background
-            for i in range(size):
-                color_val = 180 - int(i * 0.5)
-                draw.rectangle([(x, y + i), (x + size, y + i + 1)], fill=(color_val, 60, 120))
-            
-            # Musical note icon
-            draw.ellipse([x + size//2 - 15, y + size//2 + 10, x + size//2 + 5, y + size//2 + 30], fill=(255, 255, 255))
-            draw.rectangle([x + size//2 + 15, y + size//2 - 20, x + size//2 + 20, y + size//2 + 20], fill=(255, 255, 255))
-            draw.ellipse([x + size//2 + 5, y + size//2 + 10, x + size//2 + 25, y + size//2 + 30], fill=(255, 255, 255))
+            # Placeholder if cover not found, generated once per album
+            image.paste(placeholder_art(size, seed), (x, y))
         
         # Border
         draw = ImageDraw.Draw(image)
         draw.rectangle([x, y, x + size, y + size], outline=(255, 255, 255), width=2)
     
-    def draw_progress_bar(self, draw, x, y, width, height, progress):
-        """Draw progress bar"""
+    def draw_progress_bar(self, draw, x, y, width, height, progress, fill_width=None):
+        """Draw progress bar (fill_width in pixels overrides progress if given)"""
         # Background
         draw.rectangle([x, y, x + width, y + height], fill=(40, 40, 40), outline=(100, 100, 100))
         
         # Progress fill
-        fill_width = int(width * progress)
+        if fill_width is None:
+            fill_width = int(width * progress)
         if fill_width > 0:
             draw.rectangle([x, y, x + fill_width, y + height], fill=(100, 200, 255))
     
@@ -105,95 +181,338 @@ class MusicPlayer:
     
     def format_time(self, seconds):
         """Convert seconds to MM:SS format"""
-        mins = seconds // 60
-        secs = seconds % 60
-        return f"{mins}:{secs:02d}"
+        return format_time(seconds)
     
-    def draw_ui(self):
-        """Draw the complete music player UI"""
-        # Create image
-        image = Image.new('RGB', (self.lcd_width, self.lcd_height), (20, 20, 30))
-        draw = ImageDraw.Draw(image)
-        
-        track = self.playlist[self.current_track]
+    def build_sprites(self, button_size):
+        """Rasterize the control button icons into the sprite atlas"""
+        self.sprites = SpriteAtlas()
+        tile = (button_size + 1, button_size + 1)
+        for icon, active in [("prev", False), ("next", False), ("play", True), ("pause", True)]:
+            self.sprites.render(
+                icon, tile,
+                lambda draw, icon=icon, active=active:
+                    self.draw_control_button(draw, 0, 0, button_size, icon, active),
+                background=BACKGROUND_COLOR)
+    
+    def build_compositor(self):
+        """
+        Set up the UI layout: a static background plus one layer per
+        element that can change.
+        """
+        width = self.lcd_width
+        text_width = width - 20
         
-        # Header - Now Playing
-        draw.text((10, 5), "NOW PLAYING", fill=(150, 150, 150))
+        # Long titles scroll instead of being truncated
+        self.marquee = Marquee(self.text, text_width, TITLE_FONT, (255, 255, 255), BACKGROUND_COLOR)
         
         # Album art (centered)
         art_size = 100
-        art_x = (self.lcd_width - art_size) // 2
-        self.draw_album_art(image, art_x, 25, art_size, track["cover"])
-        
-        # Track title (bold/larger)
-        title_y = 135
-        title = track["title"]
-        if len(title) > 18:
-            title = title[:18] + "..."
-        draw.text((10, title_y), title, fill=(255, 255, 255))
-        
-        # Artist name
-        artist = track["artist"]
-        if len(artist) > 20:
-            artist = artist[:20] + "..."
-        draw.text((10, title_y + 16), artist, fill=(180, 180, 180))
-        
-        # Progress bar
-        current_time = int(track["duration"] * self.progress)
-        self.draw_progress_bar(draw, 10, 175, 220, 6, self.progress)
-        
-        # Time stamps
-        time_text = f"{self.format_time(current_time)} / {self.format_time(track['duration'])}"
-        draw.text((10, 185), time_text, fill=(150, 150, 150))
+        art_x = (width - art_size) // 2
+        art_y = 25
         
         # Control buttons
         button_y = 205
         button_size = 28
         spacing = 60
-        start_x = (self.lcd_width - (button_size * 3 + spacing * 2)) // 2
+        start_x = (width - (button_size * 3 + spacing * 2)) // 2
+        play_x = start_x + spacing
         
-        self.draw_control_button(draw, start_x, button_y, button_size, "prev")
-        play_pause = "pause" if self.is_playing else "play"
-        self.draw_control_button(draw, start_x + spacing, button_y, button_size, play_pause, active=True)
-        self.draw_control_button(draw, start_x + spacing * 2, button_y, button_size, "next")
+        # Control icons are rasterized once into the sprite atlas
+        self.build_sprites(button_size)
         
-        # Volume indicator (small)
-        vol_text = f"Vol: {self.volume}%"
-        draw.text((190, 5), vol_text, fill=(150, 150, 150))
+        def render_background(image):
+            # Header - Now Playing
+            self.text.draw(image, (10, 5), "NOW PLAYING", SMALL_FONT, (150, 150, 150), BACKGROUND_COLOR)
+            self.sprites.paste(image, "prev", (start_x, button_y))
+            self.sprites.paste(image, "next", (start_x + spacing * 2, button_y))
         
+        def render_art(canvas, art):
+            cover_file, seed = art
+            self.draw_album_art(canvas, 0, 0, art_size, cover_file, seed)
+        
+        def render_text(origin, size, color, max_width):
+            def render(canvas, text):
+                self.text.draw(canvas, origin, text, size, color, BACKGROUND_COLOR, max_width)
+            return render
+        
+        def render_title(canvas, key):
+            # The key includes the scroll offset, so this runs once per step
+            self.marquee.draw(canvas, (10, 1))
+        
+        def render_volume(canvas, text):
+            # Right-aligned in the top corner
+            x = canvas.width - 10 - int(self.text.measure(text, SMALL_FONT))
+            self.text.draw(canvas, (x, 5), text, SMALL_FONT, (150, 150, 150), BACKGROUND_COLOR)
+        
+        def render_progress(canvas, fill_width):
+            self.draw_progress_bar(ImageDraw.Draw(canvas), 0, 0, PROGRESS_WIDTH, 6,
+                                   fill_width / PROGRESS_WIDTH, fill_width=fill_width)
+        
+        def render_play_pause(canvas, is_playing):
+            self.sprites.paste(canvas, "pause" if is_playing else "play", (0, 0))
+        
+        compositor = Compositor((width, self.lcd_height), render_background, BACKGROUND_COLOR)
+        compositor.add_layer('volume', (160, 0, width, 22), render_volume)
+        compositor.add_layer('art', (art_x, art_y, art_x + art_size + 1, art_y + art_size + 1), render_art)
+        compositor.add_layer('title', (0, 130, width, 149), render_title)
+        compositor.add_layer('artist', (0, 149, width, 168),
+                             render_text((10, 2), ARTIST_FONT, (180, 180, 180), text_width))
+        compositor.add_layer('progress', (10, 175, 231, 182), render_progress)
+        compositor.add_layer('time', (0, 183, width, 201),
+                             render_text((10, 2), SMALL_FONT, (150, 150, 150), text_width))
+        compositor.add_layer('play_pause', (play_x, button_y, play_x + button_size + 1,
+                                            button_y + button_size + 1), render_play_pause)
+        return compositor
+    
+    def snapshot(self):
+        """Capture the current visible state as an immutable PlayerState"""
+        track = self.playlist[self.current_track]
+        duration = track["duration"]
+        return PlayerState(
+            track_index=self.current_track,
+            title=track["title"],
+            artist=track["artist"],
+            album=track.get("album", ""),
+            cover=track.get("cover"),
+            duration=duration,
+            elapsed=int(duration * self.progress),
+            progress_px=int(PROGRESS_WIDTH * self.progress),
+            volume=self.volume,
+            is_playing=self.is_playing,
+            title_offset=self.marquee.offset,
+        )
+    
+    def animate(self, now=None):
+        """
+        Advance time-based animations (the title marquee).
+        
+        Call once per loop tick. The title only scrolls while playing, so a
+        paused player stays idle. Marks the UI dirty if anything moved.
+        """
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.last_animate if self.last_animate is not None else 0.0
+        self.last_animate = now
+        
+        if self.marquee.set_text(self.playlist[self.current_track]["title"]):
+            self.mark_dirty()
+        if self.is_playing and self.marquee.advance(elapsed):
+            self.mark_dirty()
+    
+    def mark_dirty(self):
+        """Flag that the UI needs to be redrawn"""
+        self.dirty = True
+    
+    def invalidate(self):
+        """Forget what is on screen, so the next frame is sent in full"""
+        self.last_state = None
+        self.dirty = True
+    
+    def changed_regions(self, old_state, new_state):
+        """
+        Work out which screen regions differ between two UI states.
+        
+        Args:
+            old_state: PlayerState of the previously drawn frame, or None
+            new_state: PlayerState about to be drawn
+        
+        Returns:
+            List of (x_start, y_start, x_end, y_end) boxes. The progress bar
+            reports only the columns between the old and new fill widths.
+        """
+        if old_state is None:
+            return [(0, 0, self.lcd_width, self.lcd_height)]
+        
+        old_keys, new_keys = layer_keys(old_state), layer_keys(new_state)
+        regions = []
+        for layer in self.compositor.layers:
+            old, new = old_keys.get(layer.name), new_keys[layer.name]
+            if old == new:
+                continue
+            x0, y0, x1, y1 = layer.box
+            if layer.name == 'progress' and old is not None:
+                x0, x1 = x0 + min(old, new), min(x1, x0 + max(old, new) + 1)
+            regions.append((x0, y0, x1, y1))
+        return regions
+    
+    def render_frame(self):
+        """
+        Draw the UI and report what changed since the last call.
+        
+        Returns:
+            (image, regions) where regions are the boxes that differ from the
+            previous frame (see changed_regions), for partial display updates.
+        """
+        self.dirty = False
+        self.marquee.set_text(self.playlist[self.current_track]["title"])
+        state = self.snapshot()
+        
+        # Frames are memoized on the snapshot: an identical state is free
+        if state == self.last_state:
+            return self.last_frame, []
+        
+        regions = self.changed_regions(self.last_state, state)
+        image, _ = self.compositor.compose(layer_keys(state))
+        self.last_state = state
+        self.last_frame = image
+        return image, regions
+    
+    def draw_ui(self):
+        """Draw the complete music player UI"""
+        image, _ = self.render_frame()
         return image
     
-    def update_progress(self):
-        """Simulate playback progress"""
-        if self.is_playing:
+    def sync_from_mpd(self, now=None):
+        """
+        Load the current song, play state, volume and position from MPD,
+        and the queue changes since the last sync.
+        """
+        try:
+            status = self.mpd.status()
+            if self.mpd_queue.sync(self.mpd, status):
+                self.playlist = self.mpd_queue.tracks if len(self.mpd_queue) else [EMPTY_TRACK]
+        except MPDError as e:
+            print(f"MPD error: {e}")
+            return
+        
+        self.current_track = min(int(status.get("song", 0)), len(self.playlist) - 1)
+        self.is_playing = status.get("state") == "play"
+        self.volume = max(0, int(status.get("volume", self.volume)))
+        
+        # Progress is interpolated from this point until MPD reports a change
+        self.duration = float(status.get("duration") or self.playlist[self.current_track]["duration"])
+        self.elapsed = float(status.get("elapsed", 0))
+        self.elapsed_at = time.monotonic() if now is None else now
+        self.progress = min(1.0, self.elapsed / self.duration) if self.duration else 0.0
+        self.mark_dirty()
+    
+    def on_mpd_change(self, subsystems):
+        """
+        MPDWatcher callback: queue changed subsystems for the UI thread.
+        
+        Safe to call from any thread; update_progress() applies them.
+        """
+        self.mpd_events.put(subsystems)
+    
+    def _send(self, command, *args):
+        """Forward a control to MPD; return False if it failed"""
+        try:
+            getattr(self.mpd, command)(*args)
+            return True
+        except MPDError as e:
+            print(f"MPD error: {e}")
+            return False
+    
+    def update_progress(self, now=None):
+        """
+        Advance playback progress.
+        
+        With MPD attached, changes reported by the watcher are applied (one
+        status fetch however many arrived) and the position is interpolated
+        from the last status, so nothing is sent to MPD while nothing
+        changes. Otherwise playback is simulated in real time.
+        """
+        now = time.monotonic() if now is None else now
+        
+        if self.mpd is not None:
+            changed = False
+            while not self.mpd_events.empty():
+                self.mpd_events.get_nowait()
+                changed = True
+            if changed:
+                self.sync_from_mpd(now)
+            if self.is_playing and self.duration:
+                self.progress = min(1.0, (self.elapsed + now - self.elapsed_at) / self.duration)
+                self.mark_dirty()
+            return
+        
+        last, self.last_progress_update = self.last_progress_update, now
+        if self.is_playing and last is not None:
             track = self.playlist[self.current_track]
-            self.progress += 1.0 / track["duration"]
+            self.progress += (now - last) / track["duration"]
+            self.mark_dirty()
             if self.progress >= 1.0:
                 self.progress = 0.0
                 self.next_track()
     
+    def play_tracks(self, tracks, index=0):
+        """Replace the playlist (e.g. with an album from the library) and play from index"""
+        tracks = list(tracks)
+        if self.mpd is not None:
+            # Only entries backed by a file can be queued (not EMPTY_TRACK)
+            if not tracks[index].get("file"):
+                return
+            files = [track["file"] for track in tracks if track.get("file")]
+            index = sum(1 for track in tracks[:index] if track.get("file"))
+            
+            # One round trip for the whole album; the watcher reports the
+            # new queue and song
+            try:
+                with self.mpd.command_list() as batch:
+                    batch.clear()
+                    for path in files:
+                        batch.add(path)
+                    batch.play(index)
+            except MPDError as e:
+                print(f"MPD error: {e}")
+            return
+        self.playlist = tracks
+        self.current_track = index
+        self.progress = 0.0
+        self.is_playing = True
+        self.mark_dirty()
+    
+    # With MPD attached, controls only send the command: the watcher reports
+    # the resulting state, so the screen always shows what MPD is doing
+    
     def toggle_play_pause(self):
-        """Toggle play/pause state"""
-        self.is_playing = not self.is_playing
+        """Toggle play/pause state; return True if playing was requested"""
+        playing = not self.is_playing
+        if self.mpd is not None:
+            self._send("play" if playing else "pause")
+            return playing
+        self.is_playing = playing
+        self.mark_dirty()
+        return playing
     
     def next_track(self):
         """Skip to next track"""
+        if self.mpd is not None:
+            self._send("next")
+            return
         self.current_track = (self.current_track + 1) % len(self.playlist)
         self.progress = 0.0
+        self.mark_dirty()
     
     def prev_track(self):
         """Go to previous track"""
+        if self.mpd is not None:
+            if self.progress > 0.05:
+                self._send("seekcur", 0)
+            else:
+                self._send("previous")
+            return
         if self.progress > 0.05:
             self.progress = 0.0
         else:
             self.current_track = (self.current_track - 1) % len(self.playlist)
             self.progress = 0.0
+        self.mark_dirty()
     
     def volume_up(self):
-        """Increase volume"""
-        self.volume = min(100, self.volume + 5)
+        """Increase volume; return the volume requested"""
+        return self.set_volume(self.volume + 5)
     
     def volume_down(self):
-        """Decrease volume"""
-        self.volume = max(0, self.volume - 5)
+        """Decrease volume; return the volume requested"""
+        return self.set_volume(self.volume - 5)
+    
+    def set_volume(self, volume):
+        """Set the volume in percent, clamped to 0-100, and return it"""
+        volume = max(0, min(100, volume))
+        if self.mpd is not None:
+            self._send("setvol", volume)
+            return volume
+        self.volume = volume
+        self.mark_dirty()
+        return volume
 
@@ -0,0 +1,100 @@
+"""
+Frame pacing for the music player loop
+"""
+
+import time
+
+
+class FrameScheduler:
+    """
+    Pace a loop to a target frame rate on the monotonic clock.
+    
+    Each tick's deadline is one period after the previous one, so the time
+    spent rendering and polling is subtracted from the sleep rather than
+    added to it. When a tick overruns, the deadlines it missed are skipped
+    (not caught up) and the next tick is marked as one to skip rendering,
+    so input keeps being polled while the display degrades.
+    
+    Example:
+        scheduler = FrameScheduler(fps=10)
+        while True:
+            if scheduler.should_render():
+                lcd.submit(player.draw_ui())
+            poll_buttons()
+            scheduler.wait()
+    """
+    
+    def __init__(self, fps=10, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            fps: Target ticks per second
+            clock: Monotonic clock returning seconds
+            sleep: Function used to wait until the next deadline
+        """
+        self.period = 1.0 / fps
+        self.clock = clock
+        self.sleep = sleep
+        self.reset()
+    
+    def reset(self):
+        """Restart pacing and statistics from now"""
+        now = self.clock()
+        self.started = now
+        self.deadline = now + self.period
+        self.ticks = 0
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.overruns = 0
+        self.max_work = 0.0
+        self._tick_start = now
+        self._skip_next = False
+    
+    @property
+    def fps(self):
+        """Target frames per second"""
+        return 1.0 / self.period
+    
+    def should_render(self):
+        """Return True if this tick should render a frame"""
+        if self._skip_next:
+            self._skip_next = False
+            self.frames_skipped += 1
+            return False
+        self.frames_rendered += 1
+        return True
+    
+    def wait(self):
+        """Sleep until the next tick's deadline, accounting for overruns"""
+        now = self.clock()
+        self.ticks += 1
+        self.max_work = max(self.max_work, now - self._tick_start)
+        
+        if now < self.deadline:
+            self.sleep(self.deadline - now)
+            self.deadline += self.period
+        else:
+            # Drop the deadlines we missed instead of bursting to catch up
+            self.overruns += 1
+            missed = int((now - self.deadline) / self.period) + 1
+            self.deadline += missed * self.period
+            self._skip_next = True
+        
+        self._tick_start = self.clock()
+    
+    @property
+    def achieved_fps(self):
+        """Frames actually rendered per second since reset()"""
+        elapsed = self.clock() - self.started
+        return self.frames_rendered / elapsed if elapsed > 0 else 0.0
+    
+    def stats(self):
+        """Return pacing statistics as a dict"""
+        return {
+            'target_fps': round(self.fps, 2),
+            'achieved_fps': round(self.achieved_fps, 2),
+            'ticks': self.ticks,
+            'frames_rendered': self.frames_rendered,
+            'frames_skipped': self.frames_skipped,
+            'overruns': self.overruns,
+            'max_work_ms': round(self.max_work * 1000, 2),
+        }
@@ -0,0 +1,45 @@
+"""
+Immutable player state snapshots
+"""
+
+
+class PlayerState:
+    """
+    Immutable snapshot of everything the player UI shows.
+    
+    Values are stored as displayed (whole seconds, progress bar pixels,
+    scroll offset), so two snapshots compare equal exactly when they would
+    draw the same frame. Equality and hashing are O(number of fields).
+    """
+    
+    __slots__ = ('track_index', 'title', 'artist', 'album', 'cover', 'duration',
+                 'elapsed', 'progress_px', 'volume', 'is_playing', 'title_offset',
+                 '_key')
+    
+    FIELDS = __slots__[:-1]
+    
+    def __init__(self, track_index, title, artist, album, cover, duration,
+                 elapsed, progress_px, volume, is_playing, title_offset=0):
+        values = (track_index, title, artist, album, cover, duration,
+                  elapsed, progress_px, volume, is_playing, title_offset)
+        for name, value in zip(self.FIELDS, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_key', values)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("PlayerState is immutable")
+    
+    def __delattr__(self, name):
+        raise AttributeError("PlayerState is immutable")
+    
+    def __eq__(self, other):
+        if not isinstance(other, PlayerState):
+            return NotImplemented
+        return self is other or self._key == other._key
+    
+    def __hash__(self):
+        return hash(self._key)
+    
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"PlayerState({fields})"
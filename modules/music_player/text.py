@@ -0,0 +1,227 @@
+"""
+Cached text rendering for the music player UI
+"""
+
+from collections import OrderedDict
+from PIL import Image, ImageDraw, ImageFont
+
+# TrueType fonts tried in order; DejaVu ships with Raspberry Pi OS
+DEFAULT_FONT_PATHS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+]
+
+ELLIPSIS = "..."
+
+
+def text_length(font, text):
+    """Advance width of text in pixels (bitmap fonts before Pillow 9.2 only have getsize)"""
+    try:
+        return font.getlength(text)
+    except AttributeError:
+        return font.getsize(text)[0]
+
+
+def font_height(font):
+    """Height of a font without metrics, from its bounding box or getsize()"""
+    try:
+        return font.getbbox("Ag")[3]
+    except AttributeError:
+        return font.getsize("Ag")[1]
+
+
+class TextRenderer:
+    """
+    Renders strings with a TrueType font and caches the resulting bitmaps.
+    
+    Fonts are loaded once per size. Rendered strings are kept in an LRU
+    keyed by (text, font, size, color, background), so drawing a string
+    that hasn't changed is a single paste. Text is truncated by measured
+    pixel width rather than character count.
+    """
+    
+    def __init__(self, font_path=None, max_entries=256):
+        """
+        Args:
+            font_path: TrueType font file. If None, the first of
+                       DEFAULT_FONT_PATHS that loads is used, falling back
+                       to Pillow's built-in font.
+            max_entries: Number of rendered strings to keep
+        """
+        self.font_path = font_path
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def font(self, size):
+        """Return the font at a pixel size, loading it on first use"""
+        font = self.fonts.get(size)
+        if font is None:
+            font = self._load_font(size)
+            self.fonts[size] = font
+        return font
+    
+    def _load_font(self, size):
+        paths = [self.font_path] if self.font_path else DEFAULT_FONT_PATHS
+        for path in paths:
+            try:
+                font = ImageFont.truetype(path, size)
+                self.font_path = path
+                return font
+            except OSError:
+                continue
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            # Pillow < 10.1: fixed-size bitmap font only
+            return ImageFont.load_default()
+    
+    def measure(self, text, size):
+        """Return the advance width of text in pixels"""
+        return text_length(self.font(size), text)
+    
+    def fit(self, text, size, max_width):
+        """Truncate text with an ellipsis so it is at most max_width pixels wide"""
+        if self.measure(text, size) <= max_width:
+            return text
+        
+        # Binary search for the longest prefix that fits with the ellipsis
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.measure(text[:mid].rstrip() + ELLIPSIS, size) <= max_width:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low].rstrip() + ELLIPSIS
+    
+    def render(self, text, size, color, background):
+        """
+        Return an opaque bitmap of text, from the cache if possible.
+        
+        The bitmap is as wide as the text and as tall as the font's line
+        (ascent + descent), so strings drawn at the same y share a baseline.
+        """
+        key = (text, self.font_path, size, color, background)
+        image = self.cache.get(key)
+        if image is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return image
+        
+        self.misses += 1
+        font = self.font(size)
+        try:
+            ascent, descent = font.getmetrics()
+        except AttributeError:
+            # Bitmap fonts don't report metrics (nor getbbox before Pillow 9.2)
+            ascent, descent = font_height(font), 0
+        width = max(1, int(text_length(font, text) + 0.5))
+        image = Image.new('RGB', (width, ascent + descent), background)
+        ImageDraw.Draw(image).text((0, 0), text, font=font, fill=color)
+        
+        self.cache[key] = image
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return image
+    
+    def draw(self, image, xy, text, size, color, background, max_width=None):
+        """
+        Paste text into image at xy, truncating it to max_width if given.
+        
+        The background color must match what is underneath, since the
+        rendered bitmap is opaque.
+        """
+        if max_width is not None:
+            text = self.fit(text, size, max_width)
+        if text:
+            image.paste(self.render(text, size, color, background), xy)
+        return text
+
+
+class Marquee:
+    """
+    Horizontally scrolling text for strings wider than their slot.
+    
+    The full string is rendered once (through the TextRenderer cache) into
+    a strip that repeats after a gap; each frame just crops a window out of
+    it at the current offset. Strings that fit are drawn statically.
+    """
+    
+    def __init__(self, renderer, width, size, color, background,
+                 speed=30, gap=40, pause=1.5):
+        """
+        Args:
+            renderer: TextRenderer used to rasterize the strip
+            width: Width of the visible window in pixels
+            size: Font size
+            color: Text color
+            background: Background color (the strip is opaque)
+            speed: Scroll speed in pixels per second
+            gap: Blank pixels between the end of the text and its repeat
+            pause: Seconds to hold at the start before scrolling
+        """
+        self.renderer = renderer
+        self.width = width
+        self.size = size
+        self.color = color
+        self.background = background
+        self.speed = speed
+        self.gap = gap
+        self.pause = pause
+        self.text = None
+        self._strip = None
+        self.set_text("")
+    
+    def set_text(self, text):
+        """Change the text, restarting the scroll; return True if it changed"""
+        if text == self.text:
+            return False
+        self.text = text
+        self.position = 0.0
+        self.hold = self.pause
+        self._strip = None
+        self.scrolling = self.renderer.measure(text, self.size) > self.width
+        return True
+    
+    @property
+    def offset(self):
+        """Current scroll offset in whole pixels"""
+        return int(self.position)
+    
+    def advance(self, seconds):
+        """Move the scroll on by elapsed time; return True if the offset changed"""
+        if not self.scrolling:
+            return False
+        if self.hold > 0:
+            self.hold -= seconds
+            if self.hold > 0:
+                return False
+            seconds = -self.hold
+        
+        before = self.offset
+        cycle = self._loop_strip().width - self.width
+        self.position = (self.position + self.speed * seconds) % cycle
+        return self.offset != before
+    
+    def _loop_strip(self):
+        """The text, a gap, then the start of the text again, enough to wrap a window"""
+        if self._strip is None:
+            text = self.renderer.render(self.text, self.size, self.color, self.background)
+            strip = Image.new('RGB', (text.width + self.gap + self.width, text.height), self.background)
+            strip.paste(text, (0, 0))
+            strip.paste(text, (text.width + self.gap, 0))
+            self._strip = strip
+        return self._strip
+    
+    def draw(self, image, xy):
+        """Paste the visible window of the text into image at xy"""
+        if not self.scrolling:
+            self.renderer.draw(image, xy, self.text, self.size, self.color, self.background)
+            return
+        strip = self._loop_strip()
+        offset = self.offset
+        image.paste(strip.crop((offset, 0, offset + self.width, strip.height)), xy)
@@ -0,0 +1,196 @@
+"""
+Compact track storage and the MPD queue mirror
+"""
+
+import sys
+from array import array
+
+
+def row_from_song(song):
+    """
+    Convert an MPD song dict (playlistinfo/plchanges) to a TrackStore row:
+    (id, title, artist, album, duration, file).
+    """
+    path = song.get("file", "")
+    return (
+        int(song.get("Id", -1)),
+        song.get("Title") or path.rsplit("/", 1)[-1],
+        sys.intern(song.get("Artist", "Unknown Artist")),
+        sys.intern(song.get("Album", "")),
+        max(1, int(float(song.get("duration") or song.get("Time") or 0))),
+        path,
+    )
+
+
+class TrackStore:
+    """
+    Column store for a long list of tracks.
+    
+    Each field is kept in its own list or typed array instead of one dict
+    per track, and artist/album names are interned, so a 20,000-track
+    queue takes a few MB rather than tens. Indexing returns a playlist
+    entry dict built on the fly ("title", "artist", "album", "duration",
+    "cover", "file", "id"), so a store can stand in for a list of dicts.
+    """
+    
+    __slots__ = ('ids', 'titles', 'artists', 'albums', 'durations', 'files')
+    
+    def __init__(self, songs=()):
+        self.ids = array('l')
+        self.titles = []
+        self.artists = []
+        self.albums = []
+        self.durations = array('l')
+        self.files = []
+        for song in songs:
+            self.append(row_from_song(song))
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.ids):
+            raise IndexError("track position out of range")
+        return {
+            "title": self.titles[position],
+            "artist": self.artists[position],
+            "album": self.albums[position],
+            "duration": self.durations[position],
+            "cover": None,
+            "file": self.files[position],
+            "id": self.ids[position],
+        }
+    
+    def __iter__(self):
+        for position in range(len(self.ids)):
+            yield self[position]
+    
+    def row(self, position):
+        """Return the raw (id, title, artist, album, duration, file) tuple"""
+        return (self.ids[position], self.titles[position], self.artists[position],
+                self.albums[position], self.durations[position], self.files[position])
+    
+    def append(self, row):
+        song_id, title, artist, album, duration, path = row
+        self.ids.append(song_id)
+        self.titles.append(title)
+        self.artists.append(artist)
+        self.albums.append(album)
+        self.durations.append(duration)
+        self.files.append(path)
+    
+    def set_row(self, position, row):
+        """Overwrite the row at position, or append if position == len(self)"""
+        if position == len(self.ids):
+            self.append(row)
+            return
+        song_id, title, artist, album, duration, path = row
+        self.ids[position] = song_id
+        self.titles[position] = title
+        self.artists[position] = artist
+        self.albums[position] = album
+        self.durations[position] = duration
+        self.files[position] = path
+    
+    def truncate(self, length):
+        """Drop every row from position length on"""
+        for column in (self.ids, self.titles, self.artists, self.albums, self.durations, self.files):
+            del column[length:]
+    
+    def positions(self):
+        """Map song id to position"""
+        return dict(zip(self.ids, range(len(self.ids))))
+    
+    def apply(self, length, rows):
+        """
+        Apply a queue diff: write (position, row) pairs, then cut the store
+        to length.
+        
+        Raises ValueError if a position would leave a gap, in which case the
+        store should be reloaded from scratch.
+        """
+        for position, row in sorted(rows, key=lambda item: item[0]):
+            if position > len(self.ids):
+                raise ValueError(f"queue position {position} beyond end ({len(self.ids)})")
+            self.set_row(position, row)
+        self.truncate(length)
+
+
+def database_tracks(mpd):
+    """Return a TrackStore of every song in MPD's database (listallinfo)"""
+    return TrackStore(entry for entry in mpd.listallinfo() if "file" in entry)
+
+
+class QueueMirror:
+    """
+    Local copy of MPD's queue, kept in sync incrementally.
+    
+    MPD bumps the queue version on every change and can list the positions
+    that changed since an older version. sync() first asks for just
+    (position, id) pairs with plchangesposid: moves, deletes and shuffles
+    only need rows that are already here. Only when new songs appear does
+    it fetch their tags with plchanges. The full playlistinfo is read only
+    on the first sync or if the diff doesn't line up.
+    """
+    
+    def __init__(self):
+        self.tracks = TrackStore()
+        self.version = None
+        
+        # Counters
+        self.full_loads = 0
+        self.updates = 0
+    
+    def __len__(self):
+        return len(self.tracks)
+    
+    def load(self, mpd):
+        """Replace the mirror with the whole queue"""
+        self.tracks = TrackStore(mpd.playlistinfo())
+        self.full_loads += 1
+    
+    def sync(self, mpd, status):
+        """
+        Bring the mirror up to the queue version in an MPD status dict.
+        
+        Returns True if the queue changed. MPDError is passed on; the
+        version is then left alone, so the next sync retries.
+        """
+        version = status.get("playlist")
+        if version == self.version:
+            return False
+        length = int(status.get("playlistlength", 0))
+        
+        if self.version is None:
+            self.load(mpd)
+        else:
+            self.update(mpd, self.version, length)
+        
+        # Another client may have changed the queue between status and the
+        # diff; if the result doesn't match, fall back to a full load
+        if len(self.tracks) != length:
+            self.load(mpd)
+        self.version = version
+        return True
+    
+    def update(self, mpd, since, length):
+        """Apply the changes since queue version since"""
+        tracks = self.tracks
+        known = tracks.positions()
+        rows = []
+        for position, song_id in mpd.plchangesposid(since):
+            source = known.get(song_id)
+            if source is None:
+                rows = None
+                break
+            rows.append((position, tracks.row(source)))
+        
+        if rows is None:
+            # New songs: fetch the tags of every changed position
+            rows = [(int(song["Pos"]), row_from_song(song)) for song in mpd.plchanges(since)]
+        
+        try:
+            tracks.apply(length, rows)
+            self.updates += 1
+        except ValueError:
+            self.load(mpd)
@@ -4,31 +4,80 @@ Music player UI main loop
 
 import time
 from PIL import Image
-from modules.lcd import LCD_1in3, LCD_WIDTH, LCD_HEIGHT
+from modules.lcd import LCD_1in3, LCD_WIDTH, LCD_HEIGHT, VirtualPanel
+from modules.mpd import MPDError, get_broker
 from .player import MusicPlayer
+from .tracks import database_tracks
+from .library import Library, LibraryBrowser
 from .controls import InputHandler
+from .scheduler import FrameScheduler
 
 
-def run_player():
+def run_player(virtual=False, fps=10, rotation=0, show_stats=False, mpd_host=None):
     """
     Run the music player UI with full controls.
     
+    Args:
+        virtual: If True, render to a VirtualPanel instead of the real HAT
+                 (no buttons, exit with Ctrl+C)
+        fps: Target loop rate; tune per device (e.g. lower on a Pi Zero)
+        rotation: Clockwise display rotation in degrees, to match how the unit is mounted
+        show_stats: If True, print display-path timings and counters on exit
+        mpd_host: If given, play MPD's queue on this host (or Unix socket
+                  path, '' for $MPD_HOST/localhost) instead of the sample playlist
+    
     Controls:
     - KEY1 (GPIO 21)    - Play/Pause
     - Joystick LEFT     - Previous Track
     - Joystick RIGHT    - Next Track
     - Joystick UP       - Volume Up
     - Joystick DOWN     - Volume Down
+    - KEY2 (GPIO 20)    - Open/close the library
     - KEY3 (GPIO 16)    - Exit
+    
+    In the library, joystick UP/DOWN moves the selection, RIGHT or PRESS
+    opens an artist or album (or plays the selected track) and LEFT goes
+    back up a level.
     """
     print("Initializing Music Player UI...")
     
     # Initialize LCD with button support
-    lcd = LCD_1in3(setup_buttons=True)
+    panel = VirtualPanel() if virtual else None
+    lcd = LCD_1in3(setup_buttons=True, transport=panel, rotation=rotation)
     lcd.init()
     
+    # Send frames from a background thread so SPI transfers don't delay input
+    lcd.start_flush_thread()
+    
+    # MPD connections are shared process-wide through the broker
+    broker = None
+    mpd = None
+    if mpd_host is not None:
+        broker = get_broker(mpd_host or None)
+        mpd = broker.client()
+        mpd.connect()
+        print(f"Connected to MPD {mpd.mpd_version} at {mpd.address}")
+    
     # Initialize music player
-    player = MusicPlayer(LCD_WIDTH, LCD_HEIGHT)
+    player = MusicPlayer(LCD_WIDTH, LCD_HEIGHT, mpd=mpd)
+    
+    # MPD pushes state changes over the broker's idle connection
+    if broker:
+        broker.subscribe(player.on_mpd_change)
+    
+    # With MPD, browse the database: the queue is what the library replaces
+    tracks = player.playlist
+    if mpd:
+        try:
+            tracks = database_tracks(mpd)
+        except MPDError as e:
+            print(f"MPD error: {e}")
+            tracks = []
+    library = LibraryBrowser(Library(tracks), player.text, LCD_WIDTH, LCD_HEIGHT)
+    
+    # Whichever of player/library is on screen; both render the same way
+    screen = player
+    now_playing = None
     
     # Initialize input handler
     input_handler = InputHandler(lcd.GPIO)
@@ -39,55 +88,107 @@ def run_player():
     print("  Joystick RIGHT    - Next Track")
     print("  Joystick UP       - Volume Up")
     print("  Joystick DOWN     - Volume Down")
+    print("  KEY2 (GPIO 20)    - Library (UP/DOWN select, RIGHT open, LEFT back)")
     print("  KEY3 (GPIO 16)    - Exit")
     print("\nPress Ctrl+C to exit\n")
     
+    scheduler = FrameScheduler(fps)
+    
     try:
         while True:
-            # Update and display UI
-            image = player.draw_ui()
-            lcd.display(image)
+            # Redraw only when something visible changed (and not in the
+            # tick after an overrun)
+            if screen.dirty and scheduler.should_render():
+                start = time.perf_counter()
+                image, regions = screen.render_frame()
+                lcd.stats.record('render', time.perf_counter() - start)
+                lcd.submit(image, regions)
             
             # Handle button inputs
             presses = input_handler.read_buttons()
             
             # Process button presses
+            # With MPD, controls only send a command and the new state arrives
+            # later, so print what was requested rather than player state
             if presses['key1']:
-                player.toggle_play_pause()
-                print(f"{'Playing' if player.is_playing else 'Paused'}")
+                playing = player.toggle_play_pause()
+                print(f"{'Play' if playing else 'Pause'}")
             
             if presses['key3']:
                 print("Exiting...")
                 break
             
-            if presses['joy_left']:
-                player.prev_track()
-                print(f"Previous: {player.playlist[player.current_track]['title']}")
+            if presses['key2']:
+                # Switching screens repaints the whole panel
+                screen = library if screen is player else player
+                screen.invalidate()
             
-            if presses['joy_right']:
-                player.next_track()
-                print(f"Next: {player.playlist[player.current_track]['title']}")
+            elif screen is library:
+                if presses['joy_up']:
+                    library.move(-1)
+                if presses['joy_down']:
+                    library.move(1)
+                if presses['joy_left']:
+                    library.back()
+                if presses['joy_right'] or presses['joy_press']:
+                    selection = library.enter()
+                    if selection:
+                        tracks, index = selection
+                        player.play_tracks(tracks, index)
+                        print(f"Play: {tracks[index]['title']}")
+                        screen = player
+                        screen.invalidate()
             
-            if presses['joy_up']:
-                player.volume_up()
-                print(f"Volume: {player.volume}%")
+            else:
+                if presses['joy_left']:
+                    player.prev_track()
+                    print("Previous track")
+                
+                if presses['joy_right']:
+                    player.next_track()
+                    print("Next track")
+                
+                if presses['joy_up']:
+                    print(f"Volume: {player.volume_up()}%")
+                
+                if presses['joy_down']:
+                    print(f"Volume: {player.volume_down()}%")
             
-            if presses['joy_down']:
-                player.volume_down()
-                print(f"Volume: {player.volume}%")
-            
-            # Update progress animation
+            # Apply MPD changes, update progress and title scrolling
             player.update_progress()
+            player.animate()
+            
+            # Announce the track once the player actually shows it
+            track = (player.current_track, player.playlist[player.current_track]['title'])
+            if track != now_playing:
+                now_playing = track
+                print(f"Now playing: {track[1]}")
             
-            time.sleep(0.1)
+            scheduler.wait()
     
     except KeyboardInterrupt:
         print("\nMusic Player stopped")
     finally:
-        # Clear display
-        image = Image.new('RGB', (LCD_WIDTH, LCD_HEIGHT), (0, 0, 0))
-        lcd.display(image)
-        print("Display cleared. Goodbye!")
+        # Clear display; a failed SPI transfer must not skip the rest of
+        # the cleanup (the flush thread re-raises its error here)
+        try:
+            lcd.stop_flush_thread()
+            image = Image.new('RGB', (LCD_WIDTH, LCD_HEIGHT), (0, 0, 0))
+            lcd.display(image)
+            print("Display cleared. Goodbye!")
+        except Exception as e:
+            print(f"Display error: {e}")
+        print(f"Frame pacing: {scheduler.stats()}")
+        
+        if show_stats:
+            print(lcd.stats.format())
+        
+        if panel:
+            print(f"Virtual panel traffic: {panel.stats()}")
+        
+        if broker:
+            print(f"MPD broker: {broker.stats()}")
+            broker.stop()
 
 
 if __name__ == '__main__':